@@ -3,20 +3,20 @@
 Script para crear usuarios de prueba con contraseñas conocidas
 """
 
-import subprocess
+import os
 import hashlib
 import secrets
+import psycopg2
+import psycopg2.extras
 
-def execute_sql_query(query):
-    """Execute SQL query through Docker"""
-    cmd = [
-        "docker", "exec", "per_postgres",
-        "psql", "-U", "per_user", "-d", "per_exams",
-        "-c", query
-    ]
-    
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    return result.returncode == 0, result.stdout, result.stderr
+# Configuración de conexión (mismas variables que la API)
+DB_CONFIG = {
+    'host': os.getenv('DATABASE_HOST', 'localhost'),
+    'port': int(os.getenv('DATABASE_PORT', 5432)),
+    'database': os.getenv('DATABASE_NAME', 'per_exams'),
+    'user': os.getenv('DATABASE_USER', 'per_user'),
+    'password': os.getenv('DATABASE_PASSWORD', 'per_password_change_me')
+}
 
 def hash_password(password):
     """Hash password with salt"""
@@ -24,37 +24,32 @@ def hash_password(password):
     password_hash = hashlib.sha256((password + salt).encode()).hexdigest()
     return f"{salt}:{password_hash}"
 
-def create_test_user(username, email, password, role="viewer"):
-    """Create a test user with known password"""
-    
-    # Check if user already exists
-    check_query = f"SELECT id FROM users WHERE username = '{username}';"
-    success, stdout, stderr = execute_sql_query(check_query)
-    
-    if success and username in stdout:
-        print(f"⚠️  Usuario '{username}' ya existe")
-        return False
-    
-    # Hash the password
-    password_hash = hash_password(password)
-    
-    # Create user
-    insert_query = f"""
-    INSERT INTO users (username, email, password_hash, role, is_active, created_at)
-    VALUES ('{username}', '{email}', '{password_hash}', '{role}', true, NOW());
-    """
+def create_test_users(users):
+    """Create all test users in a single round-trip, skipping existing ones"""
+    rows = [
+        (user['username'], user['email'], hash_password(user['password']), user['role'])
+        for user in users
+    ]
     
-    success, stdout, stderr = execute_sql_query(insert_query)
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        with conn, conn.cursor() as cur:
+            created = psycopg2.extras.execute_values(
+                cur,
+                """
+                INSERT INTO users (username, email, password_hash, role, is_active, created_at)
+                VALUES %s
+                ON CONFLICT DO NOTHING
+                RETURNING username
+                """,
+                rows,
+                template="(%s, %s, %s, %s, true, NOW())",
+                fetch=True
+            )
+    finally:
+        conn.close()
     
-    if success:
-        print(f"✅ Usuario '{username}' creado exitosamente")
-        print(f"   Email: {email}")
-        print(f"   Contraseña: {password}")
-        print(f"   Rol: {role}")
-        return True
-    else:
-        print(f"❌ Error creando usuario '{username}': {stderr}")
-        return False
+    return {row[0] for row in created}
 
 def main():
     """Create test users with known credentials"""
@@ -85,12 +80,23 @@ def main():
         }
     ]
     
-    created_count = 0
+    try:
+        created = create_test_users(test_users)
+    except psycopg2.Error as e:
+        print(f"❌ Error creando usuarios: {e}")
+        return
     
     for user in test_users:
-        print(f"\n📝 Creando usuario: {user['username']}")
-        if create_test_user(user['username'], user['email'], user['password'], user['role']):
-            created_count += 1
+        print(f"\n📝 Usuario: {user['username']}")
+        if user['username'] in created:
+            print(f"✅ Usuario '{user['username']}' creado exitosamente")
+            print(f"   Email: {user['email']}")
+            print(f"   Contraseña: {user['password']}")
+            print(f"   Rol: {user['role']}")
+        else:
+            print(f"⚠️  Usuario '{user['username']}' ya existe")
+    
+    created_count = len(created)
     
     print(f"\n{'='*60}")
     print(f"RESUMEN: {created_count}/{len(test_users)} usuarios creados")
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Caché de respuestas de LLM para el comparador (SQLite, clave exacta)
+"""
+import hashlib
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+import orjson
+
+RUTA_CACHE_DEFECTO = Path(__file__).parent / 'llm_cache.sqlite3'
+TTL_DEFECTO = 3600 * 24
+
+def clave_cache(modelo: str, prompt: str, temperatura: float, max_tokens: int) -> str:
+    """Calcula la clave de caché a partir de todo lo que determina la respuesta"""
+    datos = orjson.dumps({
+        'modelo': modelo,
+        'prompt': prompt,
+        'temperatura': temperatura,
+        'max_tokens': max_tokens
+    }, option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(datos).hexdigest()
+
+class LLMCache:
+    """Caché persistente de respuestas crudas de las APIs de LLM"""
+
+    def __init__(self, ruta: Path = RUTA_CACHE_DEFECTO, ttl: int = TTL_DEFECTO):
+        self.ttl = ttl
+        self._conn = sqlite3.connect(str(ruta))
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS respuestas ("
+            "clave TEXT PRIMARY KEY, respuesta_json TEXT NOT NULL, "
+            "creado REAL NOT NULL, expira REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, clave: str) -> Optional[Dict[str, Any]]:
+        """Devuelve la respuesta cacheada o None si no existe o ha expirado"""
+        fila = self._conn.execute(
+            "SELECT respuesta_json, expira FROM respuestas WHERE clave = ?", (clave,)
+        ).fetchone()
+        if fila is None:
+            return None
+        if fila[1] < time.time():
+            self._conn.execute("DELETE FROM respuestas WHERE clave = ?", (clave,))
+            self._conn.commit()
+            return None
+        return orjson.loads(fila[0])
+
+    def set(self, clave: str, respuesta: Dict[str, Any], ttl: Optional[int] = None) -> None:
+        """Guarda una respuesta cruda de la API"""
+        ahora = time.time()
+        self._conn.execute(
+            "INSERT OR REPLACE INTO respuestas (clave, respuesta_json, creado, expira) VALUES (?, ?, ?, ?)",
+            (clave, orjson.dumps(respuesta).decode(), ahora, ahora + (ttl or self.ttl))
+        )
+        self._conn.commit()
+
+    def close(self) -> None:
+        """Cierra la conexión con la base de datos de caché"""
+        self._conn.close()
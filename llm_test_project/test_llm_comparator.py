@@ -2,15 +2,65 @@
 """
 Proyecto de pruebas para comparar diferentes LLMs en explicaciones náuticas
 """
-import json
 import time
 import asyncio
+import random
 import aiohttp
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass, asdict
+import ijson
+import orjson
+from typing import List, Dict, Any, Optional, Tuple
+from dataclasses import dataclass, fields
+from operator import attrgetter
 from datetime import datetime
 import os
 from pathlib import Path
+from string import Template
+
+from llm_cache import LLMCache, clave_cache
+
+# Parámetros de generación comunes a todos los modelos
+TEMPERATURA = 0.3
+MAX_TOKENS = 2000
+
+# Reintentos ante errores transitorios (rate limit y fallos del servidor)
+ESTADOS_REINTENTABLES = {429, 500, 502, 503, 504}
+MAX_INTENTOS = 5
+ESPERA_MAXIMA_REINTENTO = 30
+
+# Plantilla del prompt: solo se sustituyen las partes variables en cada llamada
+PROMPT_NAUTICO = Template("""ROLE: Eres un instructor náutico experto con 20 años de experiencia enseñando para títulos PER, PNB, Capitán de Yate.
+
+TAREA: Explicar detalladamente esta pregunta de examen náutico, ayudando al estudiante a entender no solo la respuesta correcta, sino el razonamiento técnico detrás.
+
+PREGUNTA:
+$enunciado
+
+OPCIONES:
+$opciones
+
+RESPUESTA CORRECTA: $correcta
+
+FORMATO REQUERIDO:
+🔹 **Pregunta**
+Resumen claro de qué pregunta la pregunta.
+
+🔹 **Análisis de las opciones**
+Para cada opción (A, B, C, D):
+- Definición técnica del término/concepto
+- Explicación de por qué es correcta o incorrecta
+- Contexto náutico relevante
+
+✅ **Conclusión**
+Justificación clara de por qué la respuesta $correcta es la correcta.
+
+CRITERIOS:
+- Usar terminología náutica precisa
+- Explicaciones didácticas y claras
+- Incluir ejemplos prácticos cuando sea posible
+- Mencionar normativa aplicable si es relevante (RIPA, etc.)
+- Nivel: $dificultad
+
+IMPORTANTE: La explicación debe ser comprensible pero técnicamente rigurosa.""")
 
 @dataclass
 class PreguntaPrueba:
@@ -22,7 +72,7 @@ class PreguntaPrueba:
     tema: str
     dificultad: str  # basico, intermedio, avanzado
 
-@dataclass
+@dataclass(slots=True)
 class ResultadoLLM:
     """Resultado de un LLM para una pregunta"""
     llm_name: str
@@ -35,11 +85,52 @@ class ResultadoLLM:
     calidad_puntuacion: Optional[float] = None
     errores: Optional[str] = None
 
+# Serialización de resultados sin la copia profunda de dataclasses.asdict
+_CAMPOS_RESULTADO = tuple(campo.name for campo in fields(ResultadoLLM))
+_valores_resultado = attrgetter(*_CAMPOS_RESULTADO)
+
+def _parsear_openai(respuesta: Dict[str, Any]) -> Tuple[str, int, int]:
+    """Extrae explicación y tokens de una respuesta de OpenAI"""
+    return (
+        respuesta['choices'][0]['message']['content'],
+        respuesta['usage']['prompt_tokens'],
+        respuesta['usage']['completion_tokens']
+    )
+
+def _parsear_anthropic(respuesta: Dict[str, Any]) -> Tuple[str, int, int]:
+    """Extrae explicación y tokens de una respuesta de Anthropic"""
+    return (
+        respuesta['content'][0]['text'],
+        respuesta['usage']['input_tokens'],
+        respuesta['usage']['output_tokens']
+    )
+
+class LimitadorTasa:
+    """Limitador asíncrono de peticiones por minuto (uno por proveedor)"""
+    
+    def __init__(self, peticiones_por_minuto: int):
+        self._intervalo = 60.0 / peticiones_por_minuto
+        self._siguiente = 0.0
+        self._lock = asyncio.Lock()
+    
+    async def __aenter__(self) -> 'LimitadorTasa':
+        async with self._lock:
+            ahora = time.monotonic()
+            espera = self._siguiente - ahora
+            self._siguiente = max(ahora, self._siguiente) + self._intervalo
+        if espera > 0:
+            await asyncio.sleep(espera)
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        return None
+
 class LLMComparator:
     """Comparador de diferentes LLMs para explicaciones náuticas"""
     
-    def __init__(self):
+    def __init__(self, cache: Optional[LLMCache] = None):
         self.resultados = []
+        self.cache = cache if cache is not None else LLMCache()
         self.configuraciones_llm = {
             'gpt-3.5-turbo': {
                 'url': 'https://api.openai.com/v1/chat/completions',
@@ -72,49 +163,46 @@ class LLMComparator:
                 'coste_output': 0.015
             }
         }
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Despacho por proveedor: (llamada a la API, parser de la respuesta)
+        self._provider_of = {
+            nombre: ('anthropic' if 'claude' in nombre else 'openai')
+            for nombre in self.configuraciones_llm
+        }
+        self._handlers = {
+            'openai': (self.llamar_openai_api, _parsear_openai),
+            'anthropic': (self.llamar_anthropic_api, _parsear_anthropic)
+        }
+        # Concurrencia máxima global y cuotas independientes por proveedor
+        self._semaforo = asyncio.Semaphore(8)
+        self._limitadores = {
+            'openai': LimitadorTasa(peticiones_por_minuto=60),
+            'anthropic': LimitadorTasa(peticiones_por_minuto=50)
+        }
+    
+    async def __aenter__(self) -> 'LLMComparator':
+        """Abre una única sesión HTTP reutilizada por todas las llamadas"""
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=32, ttl_dns_cache=300, keepalive_timeout=75),
+            timeout=aiohttp.ClientTimeout(total=120)
+        )
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        """Cierra la sesión HTTP compartida"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        self.cache.close()
     
     def generar_prompt_nautico(self, pregunta: PreguntaPrueba) -> str:
         """Genera prompt optimizado para explicaciones náuticas"""
-        opciones_texto = "\\n".join([
-            f"{op['letra']}) {op['texto']}" 
-            for op in pregunta.opciones
-        ])
-        
-        prompt = f"""ROLE: Eres un instructor náutico experto con 20 años de experiencia enseñando para títulos PER, PNB, Capitán de Yate.
-
-TAREA: Explicar detalladamente esta pregunta de examen náutico, ayudando al estudiante a entender no solo la respuesta correcta, sino el razonamiento técnico detrás.
-
-PREGUNTA:
-{pregunta.enunciado}
-
-OPCIONES:
-{opciones_texto}
-
-RESPUESTA CORRECTA: {pregunta.respuesta_correcta}
-
-FORMATO REQUERIDO:
-🔹 **Pregunta**
-Resumen claro de qué pregunta la pregunta.
-
-🔹 **Análisis de las opciones**
-Para cada opción (A, B, C, D):
-- Definición técnica del término/concepto
-- Explicación de por qué es correcta o incorrecta
-- Contexto náutico relevante
-
-✅ **Conclusión**
-Justificación clara de por qué la respuesta {pregunta.respuesta_correcta} es la correcta.
-
-CRITERIOS:
-- Usar terminología náutica precisa
-- Explicaciones didácticas y claras
-- Incluir ejemplos prácticos cuando sea posible
-- Mencionar normativa aplicable si es relevante (RIPA, etc.)
-- Nivel: {pregunta.dificultad}
-
-IMPORTANTE: La explicación debe ser comprensible pero técnicamente rigurosa."""
-
-        return prompt
+        return PROMPT_NAUTICO.substitute(
+            enunciado=pregunta.enunciado,
+            opciones="\n".join(f"{op['letra']}) {op['texto']}" for op in pregunta.opciones),
+            correcta=pregunta.respuesta_correcta,
+            dificultad=pregunta.dificultad
+        )
     
     async def llamar_openai_api(self, modelo: str, prompt: str) -> Dict[str, Any]:
         """Llama a la API de OpenAI"""
@@ -123,17 +211,17 @@ IMPORTANTE: La explicación debe ser comprensible pero técnicamente rigurosa.""
         payload = {
             "model": modelo,
             "messages": [{"role": "user", "content": prompt}],
-            "temperature": 0.3,
-            "max_tokens": 2000
+            "temperature": TEMPERATURA,
+            "max_tokens": MAX_TOKENS
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                config['url'], 
-                headers=config['headers'], 
-                json=payload
-            ) as response:
-                return await response.json()
+        async with self._session.post(
+            config['url'], 
+            headers=config['headers'], 
+            json=payload
+        ) as response:
+            response.raise_for_status()
+            return await response.json()
     
     async def llamar_anthropic_api(self, modelo: str, prompt: str) -> Dict[str, Any]:
         """Llama a la API de Anthropic (Claude)"""
@@ -147,59 +235,62 @@ IMPORTANTE: La explicación debe ser comprensible pero técnicamente rigurosa.""
         
         payload = {
             "model": model_names[modelo],
-            "max_tokens": 2000,
-            "temperature": 0.3,
+            "max_tokens": MAX_TOKENS,
+            "temperature": TEMPERATURA,
             "messages": [{"role": "user", "content": prompt}]
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                config['url'], 
-                headers=config['headers'], 
-                json=payload
-            ) as response:
-                return await response.json()
+        async with self._session.post(
+            config['url'], 
+            headers=config['headers'], 
+            json=payload
+        ) as response:
+            response.raise_for_status()
+            return await response.json()
+    
+    async def _llamar_con_reintentos(self, proveedor: str, llamar_api, llm_name: str, prompt: str) -> Dict[str, Any]:
+        """Llama a la API reintentando errores transitorios con backoff exponencial y jitter"""
+        for intento in range(1, MAX_INTENTOS + 1):
+            try:
+                async with self._limitadores[proveedor]:
+                    return await llamar_api(llm_name, prompt)
+            except aiohttp.ClientResponseError as e:
+                if e.status not in ESTADOS_REINTENTABLES or intento == MAX_INTENTOS:
+                    raise
+            except asyncio.TimeoutError:
+                if intento == MAX_INTENTOS:
+                    raise
+            
+            espera = random.uniform(1, min(ESPERA_MAXIMA_REINTENTO, 2 ** intento))
+            print(f"⏳ {llm_name}: error transitorio, reintento {intento}/{MAX_INTENTOS - 1} en {espera:.1f}s")
+            await asyncio.sleep(espera)
     
-    async def probar_llm(self, llm_name: str, pregunta: PreguntaPrueba) -> ResultadoLLM:
-        """Prueba un LLM específico con una pregunta"""
+    async def probar_llm(self, llm_name: str, pregunta: PreguntaPrueba,
+                         prompt: Optional[str] = None) -> ResultadoLLM:
+        """Prueba un LLM específico con una pregunta (prompt ya generado si se pasa)"""
         print(f"🔄 Probando {llm_name} con pregunta {pregunta.id}...")
         
-        prompt = self.generar_prompt_nautico(pregunta)
+        if prompt is None:
+            prompt = self.generar_prompt_nautico(pregunta)
         config = self.configuraciones_llm[llm_name]
         
+        proveedor = self._provider_of[llm_name]
+        llamar_api, parsear = self._handlers[proveedor]
+        
+        # Respuestas idénticas ya pagadas se sirven desde la caché
+        clave = clave_cache(llm_name, prompt, TEMPERATURA, MAX_TOKENS)
+        respuesta = self.cache.get(clave)
+        desde_cache = respuesta is not None
+        
         inicio = time.time()
         
         try:
-            if 'gpt' in llm_name:
-                respuesta = await self.llamar_openai_api(llm_name, prompt)
-                explicacion = respuesta['choices'][0]['message']['content']
-                tokens_input = respuesta['usage']['prompt_tokens']
-                tokens_output = respuesta['usage']['completion_tokens']
-                
-            elif 'claude' in llm_name:
-                respuesta = await self.llamar_anthropic_api(llm_name, prompt)
-                explicacion = respuesta['content'][0]['text']
-                tokens_input = respuesta['usage']['input_tokens']
-                tokens_output = respuesta['usage']['output_tokens']
-            
-            tiempo_respuesta = time.time() - inicio
-            
-            # Calcular coste
-            coste = (
-                (tokens_input / 1000) * config['coste_input'] +
-                (tokens_output / 1000) * config['coste_output']
-            )
-            
-            return ResultadoLLM(
-                llm_name=llm_name,
-                pregunta_id=pregunta.id,
-                explicacion_generada=explicacion,
-                tiempo_respuesta=tiempo_respuesta,
-                tokens_input=tokens_input,
-                tokens_output=tokens_output,
-                coste_estimado=coste
-            )
+            if not desde_cache:
+                async with self._semaforo:
+                    inicio = time.time()
+                    respuesta = await self._llamar_con_reintentos(proveedor, llamar_api, llm_name, prompt)
             
+            explicacion, tokens_input, tokens_output = parsear(respuesta)
         except Exception as e:
             return ResultadoLLM(
                 llm_name=llm_name,
@@ -211,52 +302,82 @@ IMPORTANTE: La explicación debe ser comprensible pero técnicamente rigurosa.""
                 coste_estimado=0,
                 errores=str(e)
             )
+        
+        if desde_cache:
+            return ResultadoLLM(
+                llm_name=llm_name,
+                pregunta_id=pregunta.id,
+                explicacion_generada=explicacion,
+                tiempo_respuesta=0,
+                tokens_input=tokens_input,
+                tokens_output=tokens_output,
+                coste_estimado=0
+            )
+        
+        tiempo_respuesta = time.time() - inicio
+        self.cache.set(clave, respuesta)
+        
+        # Calcular coste
+        coste = (
+            (tokens_input / 1000) * config['coste_input'] +
+            (tokens_output / 1000) * config['coste_output']
+        )
+        
+        return ResultadoLLM(
+            llm_name=llm_name,
+            pregunta_id=pregunta.id,
+            explicacion_generada=explicacion,
+            tiempo_respuesta=tiempo_respuesta,
+            tokens_input=tokens_input,
+            tokens_output=tokens_output,
+            coste_estimado=coste
+        )
     
     def seleccionar_preguntas_prueba(self, archivo_json: str, cantidad: int = 10) -> List[PreguntaPrueba]:
         """Selecciona preguntas representativas para la prueba"""
-        with open(archivo_json, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
         preguntas_prueba = []
-        examenes = data.get('examenes', [])
         
         # Seleccionar preguntas variadas
         temas_incluidos = set()
         dificultades = ['basico', 'intermedio', 'avanzado']
         
-        for i, examen in enumerate(examenes):
-            if len(preguntas_prueba) >= cantidad:
-                break
-                
-            for j, pregunta in enumerate(examen.get('preguntas', [])):
+        # Lectura incremental: se deja de parsear en cuanto hay suficientes preguntas
+        with open(archivo_json, 'rb') as f:
+            examenes = ijson.items(f, 'examenes.item', use_float=True)
+            
+            for examen in examenes:
                 if len(preguntas_prueba) >= cantidad:
                     break
-                
-                tema = pregunta.get('tema', 'Sin tema')
-                
-                # Diversificar por tema
-                if tema not in temas_incluidos or len(temas_incluidos) < 3:
-                    temas_incluidos.add(tema)
                     
-                    # Asignar dificultad basada en complejidad del enunciado
-                    enunciado = pregunta.get('enunciado', '')
-                    if len(enunciado) < 100:
-                        dificultad = 'basico'
-                    elif len(enunciado) < 200:
-                        dificultad = 'intermedio'
-                    else:
-                        dificultad = 'avanzado'
+                for j, pregunta in enumerate(examen.get('preguntas', [])):
+                    if len(preguntas_prueba) >= cantidad:
+                        break
                     
-                    pregunta_prueba = PreguntaPrueba(
-                        id=f"{examen.get('convocatoria', 'unknown')}_{examen.get('titulacion', 'unknown')}_{j+1}",
-                        enunciado=enunciado,
-                        opciones=pregunta.get('opciones', []),
-                        respuesta_correcta=pregunta.get('respuesta_correcta', 'A'),
-                        tema=tema,
-                        dificultad=dificultad
-                    )
+                    tema = pregunta.get('tema', 'Sin tema')
                     
-                    preguntas_prueba.append(pregunta_prueba)
+                    # Diversificar por tema
+                    if tema not in temas_incluidos or len(temas_incluidos) < 3:
+                        temas_incluidos.add(tema)
+                        
+                        # Asignar dificultad basada en complejidad del enunciado
+                        enunciado = pregunta.get('enunciado', '')
+                        if len(enunciado) < 100:
+                            dificultad = 'basico'
+                        elif len(enunciado) < 200:
+                            dificultad = 'intermedio'
+                        else:
+                            dificultad = 'avanzado'
+                        
+                        pregunta_prueba = PreguntaPrueba(
+                            id=f"{examen.get('convocatoria', 'unknown')}_{examen.get('titulacion', 'unknown')}_{j+1}",
+                            enunciado=enunciado,
+                            opciones=pregunta.get('opciones', []),
+                            respuesta_correcta=pregunta.get('respuesta_correcta', 'A'),
+                            tema=tema,
+                            dificultad=dificultad
+                        )
+                        
+                        preguntas_prueba.append(pregunta_prueba)
         
         return preguntas_prueba[:cantidad]
     
@@ -270,59 +391,86 @@ IMPORTANTE: La explicación debe ser comprensible pero técnicamente rigurosa.""
             print(f"\\n📋 Pregunta: {pregunta.id}")
             print(f"🎯 Tema: {pregunta.tema} | Dificultad: {pregunta.dificultad}")
             
-            for llm_name in llms_a_probar:
-                resultado = await self.probar_llm(llm_name, pregunta)
+            # El prompt es el mismo para todos los LLMs: se genera una sola vez
+            prompt = self.generar_prompt_nautico(pregunta)
+            
+            # Todos los LLMs en paralelo; las cuotas las controla cada limitador
+            tareas = [self.probar_llm(llm_name, pregunta, prompt) for llm_name in llms_a_probar]
+            resultados = await asyncio.gather(*tareas, return_exceptions=True)
+            
+            for llm_name, resultado in zip(llms_a_probar, resultados):
+                if isinstance(resultado, BaseException):
+                    resultado = ResultadoLLM(
+                        llm_name=llm_name,
+                        pregunta_id=pregunta.id,
+                        explicacion_generada="",
+                        tiempo_respuesta=0,
+                        tokens_input=0,
+                        tokens_output=0,
+                        coste_estimado=0,
+                        errores=str(resultado)
+                    )
                 self.resultados.append(resultado)
                 
                 if resultado.errores:
                     print(f"❌ {llm_name}: Error - {resultado.errores}")
                 else:
                     print(f"✅ {llm_name}: {resultado.tiempo_respuesta:.2f}s, ${resultado.coste_estimado:.4f}")
-                
-                # Pausa entre llamadas para evitar rate limits
-                await asyncio.sleep(1)
     
     def generar_reporte_comparativo(self) -> Dict[str, Any]:
         """Genera reporte comparativo de resultados"""
         if not self.resultados:
             return {}
         
-        # Agrupar por LLM
-        resultados_por_llm = {}
+        # Acumular todas las métricas por LLM en una sola pasada
+        acumulados = {}
         for resultado in self.resultados:
-            if resultado.llm_name not in resultados_por_llm:
-                resultados_por_llm[resultado.llm_name] = []
-            resultados_por_llm[resultado.llm_name].append(resultado)
+            acc = acumulados.get(resultado.llm_name)
+            if acc is None:
+                acc = acumulados[resultado.llm_name] = {
+                    'total': 0, 'exitosas': 0, 'tiempo': 0.0, 'coste': 0.0,
+                    'tokens_input': 0, 'tokens_output': 0
+                }
+            acc['total'] += 1
+            if resultado.errores:
+                continue
+            acc['exitosas'] += 1
+            acc['tiempo'] += resultado.tiempo_respuesta
+            acc['coste'] += resultado.coste_estimado
+            acc['tokens_input'] += resultado.tokens_input
+            acc['tokens_output'] += resultado.tokens_output
         
         # Calcular estadísticas
         estadisticas = {}
-        for llm_name, resultados in resultados_por_llm.items():
-            resultados_exitosos = [r for r in resultados if not r.errores]
+        for llm_name, acc in acumulados.items():
+            exitosas = acc['exitosas']
             
-            if resultados_exitosos:
+            if exitosas:
                 estadisticas[llm_name] = {
-                    'total_preguntas': len(resultados),
-                    'exitosas': len(resultados_exitosos),
-                    'errores': len(resultados) - len(resultados_exitosos),
-                    'tiempo_promedio': sum(r.tiempo_respuesta for r in resultados_exitosos) / len(resultados_exitosos),
-                    'coste_promedio': sum(r.coste_estimado for r in resultados_exitosos) / len(resultados_exitosos),
-                    'coste_total': sum(r.coste_estimado for r in resultados_exitosos),
-                    'tokens_promedio_input': sum(r.tokens_input for r in resultados_exitosos) / len(resultados_exitosos),
-                    'tokens_promedio_output': sum(r.tokens_output for r in resultados_exitosos) / len(resultados_exitosos)
+                    'total_preguntas': acc['total'],
+                    'exitosas': exitosas,
+                    'errores': acc['total'] - exitosas,
+                    'tiempo_promedio': acc['tiempo'] / exitosas,
+                    'coste_promedio': acc['coste'] / exitosas,
+                    'coste_total': acc['coste'],
+                    'tokens_promedio_input': acc['tokens_input'] / exitosas,
+                    'tokens_promedio_output': acc['tokens_output'] / exitosas
                 }
         
         return {
             'timestamp': datetime.now().isoformat(),
             'estadisticas_por_llm': estadisticas,
-            'resultados_detallados': [asdict(r) for r in self.resultados]
+            'resultados_detallados': [
+                dict(zip(_CAMPOS_RESULTADO, _valores_resultado(r))) for r in self.resultados
+            ]
         }
     
     def guardar_resultados(self, archivo: str = 'resultados_comparacion_llms.json'):
         """Guarda resultados en archivo JSON"""
         reporte = self.generar_reporte_comparativo()
         
-        with open(archivo, 'w', encoding='utf-8') as f:
-            json.dump(reporte, f, ensure_ascii=False, indent=2)
+        with open(archivo, 'wb') as f:
+            f.write(orjson.dumps(reporte, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
         
         print(f"💾 Resultados guardados en: {archivo}")
 
@@ -347,20 +495,19 @@ async def main():
     
     print(f"✅ APIs disponibles: {apis_disponibles}")
     
-    # Crear comparador
-    comparador = LLMComparator()
-    
     # Seleccionar preguntas de prueba
     archivo_datos = '../src/web/data_unificado.json'
     if not os.path.exists(archivo_datos):
         print(f"❌ No se encontró {archivo_datos}")
         return
     
-    preguntas = comparador.seleccionar_preguntas_prueba(archivo_datos, cantidad=5)
-    print(f"📝 Seleccionadas {len(preguntas)} preguntas de prueba")
-    
-    # Ejecutar comparación
-    await comparador.ejecutar_comparacion_completa(preguntas, apis_disponibles)
+    # Crear comparador (sesión HTTP compartida durante toda la comparación)
+    async with LLMComparator() as comparador:
+        preguntas = comparador.seleccionar_preguntas_prueba(archivo_datos, cantidad=5)
+        print(f"📝 Seleccionadas {len(preguntas)} preguntas de prueba")
+        
+        # Ejecutar comparación
+        await comparador.ejecutar_comparacion_completa(preguntas, apis_disponibles)
     
     # Generar y guardar reporte
     comparador.guardar_resultados()
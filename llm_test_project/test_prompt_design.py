@@ -2,9 +2,12 @@
 """
 Diseño y prueba de prompts para explicaciones náuticas
 """
-import json
+import ijson
+import orjson
 import sys
+from collections import Counter
 from pathlib import Path
+from string import Template
 
 def cargar_pregunta_ejemplo():
     """Carga una pregunta ejemplo para diseñar el prompt"""
@@ -22,59 +25,48 @@ def cargar_pregunta_ejemplo():
         "dificultad": "basico"
     }
 
-def generar_prompt_v1(pregunta):
-    """Prompt básico"""
-    opciones_texto = "\\n".join([f"{op['letra']}) {op['texto']}" for op in pregunta['opciones']])
-    
-    return f"""Explica esta pregunta de examen náutico:
+# Plantillas precompiladas: el texto fijo se analiza una sola vez
+PROMPT_V1 = Template("""Explica esta pregunta de examen náutico:
 
-PREGUNTA: {pregunta['enunciado']}
+PREGUNTA: $enunciado
 
 OPCIONES:
-{opciones_texto}
+$opciones
 
-RESPUESTA CORRECTA: {pregunta['respuesta_correcta']}
+RESPUESTA CORRECTA: $correcta
 
-Proporciona una explicación clara de por qué la respuesta es correcta y por qué las otras opciones son incorrectas."""
+Proporciona una explicación clara de por qué la respuesta es correcta y por qué las otras opciones son incorrectas.""")
 
-def generar_prompt_v2(pregunta):
-    """Prompt mejorado con estructura"""
-    opciones_texto = "\\n".join([f"{op['letra']}) {op['texto']}" for op in pregunta['opciones']])
-    
-    return f"""ROLE: Instructor náutico experto.
+PROMPT_V2 = Template("""ROLE: Instructor náutico experto.
 
 TAREA: Explicar pregunta de examen PER/PNB de forma didáctica.
 
 PREGUNTA:
-{pregunta['enunciado']}
+$enunciado
 
 OPCIONES:
-{opciones_texto}
+$opciones
 
-RESPUESTA CORRECTA: {pregunta['respuesta_correcta']}
+RESPUESTA CORRECTA: $correcta
 
 FORMATO REQUERIDO:
 🔹 Análisis de cada opción
 🔹 Justificación de la respuesta correcta
 🔹 Contexto náutico relevante
 
-Usa terminología técnica precisa pero explicaciones claras."""
+Usa terminología técnica precisa pero explicaciones claras.""")
 
-def generar_prompt_v3_optimizado(pregunta):
-    """Prompt optimizado final basado en el ejemplo proporcionado"""
-    opciones_texto = "\\n".join([f"{op['letra']}) {op['texto']}" for op in pregunta['opciones']])
-    
-    return f"""ROLE: Eres un instructor náutico experto con 20 años de experiencia enseñando para títulos PER, PNB, Capitán de Yate.
+PROMPT_V3_OPTIMIZADO = Template("""ROLE: Eres un instructor náutico experto con 20 años de experiencia enseñando para títulos PER, PNB, Capitán de Yate.
 
 TAREA: Explicar detalladamente esta pregunta de examen náutico, ayudando al estudiante a entender no solo la respuesta correcta, sino el razonamiento técnico detrás.
 
 PREGUNTA:
-{pregunta['enunciado']}
+$enunciado
 
 OPCIONES:
-{opciones_texto}
+$opciones
 
-RESPUESTA CORRECTA: {pregunta['respuesta_correcta']}
+RESPUESTA CORRECTA: $correcta
 
 FORMATO REQUERIDO:
 🔹 **Pregunta**
@@ -95,16 +87,41 @@ B) [Nombre de la opción] (si es la correcta)
 [Continuar con C y D]
 
 ✅ **Conclusión**
-Justificación clara de por qué la respuesta {pregunta['respuesta_correcta']} es la correcta, resumiendo los puntos clave.
+Justificación clara de por qué la respuesta $correcta es la correcta, resumiendo los puntos clave.
 
 CRITERIOS:
 - Usar terminología náutica precisa
 - Explicaciones didácticas y claras
 - Incluir ejemplos prácticos cuando sea posible
 - Mencionar normativa aplicable si es relevante (RIPA, etc.)
-- Nivel de dificultad: {pregunta['dificultad']}
+- Nivel de dificultad: $dificultad
+
+IMPORTANTE: La explicación debe ser comprensible pero técnicamente rigurosa, como si estuvieras preparando al estudiante para el examen real.""")
+
+def _formatear_opciones(opciones):
+    """Une las opciones en el formato 'A) texto', una por línea"""
+    return "\n".join(f"{op['letra']}) {op['texto']}" for op in opciones)
+
+def _rellenar_prompt(plantilla, pregunta):
+    """Sustituye las partes variables de una plantilla de prompt"""
+    return plantilla.substitute(
+        enunciado=pregunta['enunciado'],
+        opciones=_formatear_opciones(pregunta['opciones']),
+        correcta=pregunta['respuesta_correcta'],
+        dificultad=pregunta.get('dificultad', '')
+    )
 
-IMPORTANTE: La explicación debe ser comprensible pero técnicamente rigurosa, como si estuvieras preparando al estudiante para el examen real."""
+def generar_prompt_v1(pregunta):
+    """Prompt básico"""
+    return _rellenar_prompt(PROMPT_V1, pregunta)
+
+def generar_prompt_v2(pregunta):
+    """Prompt mejorado con estructura"""
+    return _rellenar_prompt(PROMPT_V2, pregunta)
+
+def generar_prompt_v3_optimizado(pregunta):
+    """Prompt optimizado final basado en el ejemplo proporcionado"""
+    return _rellenar_prompt(PROMPT_V3_OPTIMIZADO, pregunta)
 
 def generar_explicacion_ejemplo_manual():
     """Genera la explicación ejemplo que proporcionaste como referencia"""
@@ -178,59 +195,56 @@ def comparar_prompts():
 def seleccionar_preguntas_variadas(archivo_json: str, cantidad: int = 10):
     """Selecciona preguntas variadas para pruebas"""
     try:
-        with open(archivo_json, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
         preguntas_seleccionadas = []
-        examenes = data.get('examenes', [])
         
         # Criterios de selección
-        temas_incluidos = set()
+        tema_counts = Counter()
         titulaciones_incluidas = set()
+        long_enunciado_count = 0
         
-        for examen in examenes:
-            if len(preguntas_seleccionadas) >= cantidad:
-                break
-                
-            for i, pregunta in enumerate(examen.get('preguntas', [])):
+        # Lectura incremental: se deja de parsear en cuanto hay suficientes preguntas
+        with open(archivo_json, 'rb') as f:
+            examenes = ijson.items(f, 'examenes.item', use_float=True)
+            
+            for examen in examenes:
                 if len(preguntas_seleccionadas) >= cantidad:
                     break
                 
-                tema = pregunta.get('tema', 'Sin tema')
-                titulacion = examen.get('titulacion', 'unknown')
-                enunciado = pregunta.get('enunciado', '')
-                
-                # Diversificar selección
-                incluir = False
+                for i, pregunta in enumerate(examen.get('preguntas', [])):
+                    if len(preguntas_seleccionadas) >= cantidad:
+                        break
                 
-                # Por tema (máximo 2 por tema)
-                if temas_incluidos.count(tema) < 2:
-                    incluir = True
+                    tema = pregunta.get('tema', 'Sin tema')
+                    titulacion = examen.get('titulacion', 'unknown')
+                    enunciado = pregunta.get('enunciado', '')
                 
-                # Por titulación
-                if titulacion not in titulaciones_incluidas:
-                    incluir = True
+                    es_largo = len(enunciado) > 150
                 
-                # Por complejidad (variar longitud de enunciado)
-                if len(enunciado) > 150 and len([p for p in preguntas_seleccionadas if len(p['enunciado']) > 150]) < 3:
-                    incluir = True
+                    # Diversificar selección: por tema (máximo 2 por tema), por titulación
+                    # o por complejidad (variar longitud de enunciado)
+                    incluir = (
+                        tema_counts[tema] < 2
+                        or titulacion not in titulaciones_incluidas
+                        or (es_largo and long_enunciado_count < 3)
+                    )
                 
-                if incluir:
-                    temas_incluidos.add(tema)
-                    titulaciones_incluidas.add(titulacion)
+                    if incluir:
+                        tema_counts[tema] += 1
+                        titulaciones_incluidas.add(titulacion)
+                        long_enunciado_count += es_largo
                     
-                    pregunta_procesada = {
-                        'id': f"{examen.get('convocatoria', 'unknown')}_{titulacion}_{i+1}",
-                        'enunciado': enunciado,
-                        'opciones': pregunta.get('opciones', []),
-                        'respuesta_correcta': pregunta.get('respuesta_correcta', 'A'),
-                        'tema': tema,
-                        'titulacion': titulacion,
-                        'convocatoria': examen.get('convocatoria', 'unknown'),
-                        'dificultad': 'intermedio' if len(enunciado) > 150 else 'basico'
-                    }
+                        pregunta_procesada = {
+                            'id': f"{examen.get('convocatoria', 'unknown')}_{titulacion}_{i+1}",
+                            'enunciado': enunciado,
+                            'opciones': pregunta.get('opciones', []),
+                            'respuesta_correcta': pregunta.get('respuesta_correcta', 'A'),
+                            'tema': tema,
+                            'titulacion': titulacion,
+                            'convocatoria': examen.get('convocatoria', 'unknown'),
+                            'dificultad': 'intermedio' if es_largo else 'basico'
+                        }
                     
-                    preguntas_seleccionadas.append(pregunta_procesada)
+                        preguntas_seleccionadas.append(pregunta_procesada)
         
         return preguntas_seleccionadas
     
@@ -259,8 +273,8 @@ def main():
                 print(f"     Enunciado: {p['enunciado'][:60]}...")
             
             # Guardar preguntas de prueba
-            with open('llm_test_project/preguntas_prueba.json', 'w', encoding='utf-8') as f:
-                json.dump(preguntas, f, ensure_ascii=False, indent=2)
+            with open('llm_test_project/preguntas_prueba.json', 'wb') as f:
+                f.write(orjson.dumps(preguntas, option=orjson.OPT_INDENT_2))
             print("\\n💾 Preguntas guardadas en: llm_test_project/preguntas_prueba.json")
         else:
             print("❌ No se pudieron seleccionar preguntas")
@@ -5,215 +5,526 @@ Allows querying the PER exam database using natural language
 """
 
 import asyncio
+import os
+import random
 import sys
-import json
-import subprocess
-from typing import Dict, Any, List
+import time
+import traceback
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Any, Awaitable, Callable, List, Optional
+
+import asyncpg
+import orjson
+import sqlglot
+from sqlglot import exp
+
+# Canned introspection queries (asyncpg prepares and caches them per connection)
+PREPARED_QUERIES = {
+    "per_schema": """
+        SELECT 
+            table_name,
+            column_name,
+            data_type,
+            is_nullable
+        FROM information_schema.columns 
+        WHERE table_schema = 'public'
+        ORDER BY table_name, ordinal_position
+    """,
+    "per_schema_version": """
+        SELECT
+            count(*) AS columnas,
+            sum(a.xmin::text::bigint) AS attr_xmin,
+            sum(c.xmin::text::bigint) AS class_xmin
+        FROM pg_attribute a
+        JOIN pg_class c ON c.oid = a.attrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public'
+          AND a.attnum > 0
+          AND c.relkind IN ('r', 'v', 'm', 'p', 'f')
+    """,
+    "per_counts": """
+        SELECT
+            c.relname AS tabla,
+            CASE WHEN c.reltuples < 0 THEN NULL ELSE c.reltuples::bigint END AS registros
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public'
+          AND c.relkind = 'r'
+          AND c.relname IN ('exams', 'questions', 'answer_options', 'question_explanations')
+        ORDER BY array_position(
+            ARRAY['exams', 'questions', 'answer_options', 'question_explanations'], c.relname::text
+        )
+    """,
+    "per_convocatorias": """
+        SELECT DISTINCT convocatoria, COUNT(*) as preguntas
+        FROM exams e
+        JOIN questions q ON e.id = q.exam_id
+        WHERE convocatoria IS NOT NULL
+        GROUP BY convocatoria
+        ORDER BY convocatoria DESC
+    """,
+    "per_temas": """
+        SELECT categoria, COUNT(*) as preguntas
+        FROM questions
+        WHERE categoria IS NOT NULL
+        GROUP BY categoria
+        ORDER BY preguntas DESC
+    """
+}
+
+# Introspection results change on the order of minutes: serve them from memory
+INTROSPECTION_CACHE_TTL = 60
+INTROSPECTION_CACHE_JITTER = 0.05
+
+# Memoized custom_query results, keyed by canonical SQL + parameters
+QUERY_CACHE_TTL = 30
+QUERY_CACHE_MAX_ENTRIES = 500
+
+# Rows returned by custom_query at most (the rest is never fetched from the server)
+CUSTOM_QUERY_MAX_ROWS = int(os.getenv("MCP_MAX_ROWS", 1000))
+
+# Prepared statements kept per pooled connection
+STATEMENT_CACHE_SIZE = 500
+
+# Longest JSON-RPC line read from stdin (asyncio's default StreamReader limit is 64 KiB)
+MAX_REQUEST_LINE = 64 * 1024 * 1024
+
+def encode_json(obj: Any) -> str:
+    """Compact JSON for the wire; types orjson lacks (Decimal, etc.) become strings"""
+    return orjson.dumps(obj, default=str).decode()
+
+# Failures that come from the database or the connection to it (everything else is a bug)
+DB_ERRORS = (asyncpg.PostgresError, asyncpg.InterfaceError, OSError, asyncio.TimeoutError)
+
+# Nodes that write data even when nested inside a SELECT (data-modifying CTEs, SELECT INTO)
+_WRITE_NODES = (exp.Insert, exp.Update, exp.Delete, exp.Merge, exp.Into)
+
+@lru_cache(maxsize=512)
+def validate_select(sql: str) -> Optional[str]:
+    """Return an error message unless ``sql`` is exactly one read-only SELECT/WITH query"""
+    try:
+        trees = [tree for tree in sqlglot.parse(sql, read='postgres') if tree is not None]
+    except sqlglot.errors.SqlglotError as e:
+        return f"Invalid SQL: {e}"
+    if len(trees) != 1:
+        return "Only a single statement is allowed"
+    if not isinstance(trees[0], exp.Query) or trees[0].find(*_WRITE_NODES):
+        return "Only SELECT queries are allowed"
+    return None
+
+def validate_query_args(sql: Any, params: Any) -> Optional[str]:
+    """Check the custom_query arguments sent by the client, then the SQL itself"""
+    if not isinstance(sql, str):
+        return "sql must be a string"
+    if params is not None and not isinstance(params, list):
+        return "params must be an array"
+    return validate_select(sql)
+
+def canonicalize_sql(sql: str) -> str:
+    """Cache key for a query: only outer whitespace and the trailing ';' are dropped.
+
+    Inner whitespace is kept as is: collapsing it would also rewrite $$...$$ literals and
+    join a -- comment with the next line, so queries with different meaning could share a key.
+    """
+    return sql.strip().rstrip(';').strip()
+
+# Tool catalogue: static, so the list_tools result is serialized once at import
+TOOLS = [
+    {
+        "name": "get_schema",
+        "description": "Get database schema information"
+    },
+    {
+        "name": "get_table_counts", 
+        "description": "Get estimated row counts for all tables"
+    },
+    {
+        "name": "query_convocatorias",
+        "description": "Get all available exam convocatorias with question counts"
+    },
+    {
+        "name": "query_temas",
+        "description": "Get all question topics/categories with counts"
+    },
+    {
+        "name": "custom_query",
+        "description": "Execute custom SELECT query",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "sql": {
+                    "type": "string",
+                    "description": "SQL SELECT query to execute"
+                },
+                "params": {
+                    "type": "array",
+                    "description": "Values bound to $1, $2... placeholders in the query"
+                }
+            },
+            "required": ["sql"]
+        }
+    },
+    {
+        "name": "custom_query_bulk",
+        "description": "Export a SELECT query as CSV text (COPY TO STDOUT, no row limit)",
+        "inputSchema": {
+            "type": "object",
+            "properties": {
+                "sql": {
+                    "type": "string",
+                    "description": "SQL SELECT query to export"
+                },
+                "params": {
+                    "type": "array",
+                    "description": "Values bound to $1, $2... placeholders in the query"
+                }
+            },
+            "required": ["sql"]
+        }
+    }
+]
+LIST_TOOLS_RESULT = orjson.dumps({"tools": TOOLS})
+
+# Response frames are assembled from precomputed byte pieces around the encoded id and payload
+RESPONSE_PREFIX = b'{"jsonrpc":"2.0","id":'
+RESULT_MID = b',"result":'
+TEXT_CONTENT_PREFIX = b'{"content":[{"type":"text","text":'
+TEXT_CONTENT_SUFFIX = b'}]}'
 
 class PostgreSQLMCP:
     def __init__(self):
+        # Direct TCP connection to Postgres (published port or compose network), never docker exec.
+        # DATABASE_URL, as set for the compose services, takes precedence over the DATABASE_* variables
+        self.dsn = os.getenv("DATABASE_URL")
         self.db_config = {
-            "container": "per_postgres",
-            "user": "per_user", 
-            "database": "per_exams"
+            "host": os.getenv("DATABASE_HOST", "localhost"),
+            "port": int(os.getenv("DATABASE_PORT", 5432)),
+            "user": os.getenv("DATABASE_USER", "per_user"),
+            "password": os.getenv("DATABASE_PASSWORD", "per_password_change_me"),
+            "database": os.getenv("DATABASE_NAME", "per_exams")
+        }
+        self.pool: Optional[asyncpg.Pool] = None
+        self.enable_schema_cache = os.getenv("MCP_SCHEMA_CACHE", "1") != "0"
+        self._cache: Dict[str, tuple] = {}
+        # (catalog version, result) of the last schema fetch; DDL changes the version
+        self._schema: Optional[tuple] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._query_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        # Tool name -> coroutine taking the call arguments
+        self._tool_handlers: Dict[str, Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]] = {
+            "get_schema": lambda arguments: self.get_schema_info(),
+            "get_table_counts": lambda arguments: self.get_table_counts(),
+            "query_convocatorias": lambda arguments: self.query_convocatorias(),
+            "query_temas": lambda arguments: self.query_temas(),
+            "custom_query": lambda arguments: self.custom_query(
+                arguments.get('sql', ''), arguments.get('params')
+            ),
+            "custom_query_bulk": lambda arguments: self.custom_query_bulk(
+                arguments.get('sql', ''), arguments.get('params')
+            )
         }
+    
+    async def connect(self):
+        """Open the connection pool shared by all concurrent tool calls"""
+        connect_args = {"dsn": self.dsn} if self.dsn else self.db_config
+        self.pool = await asyncpg.create_pool(
+            **connect_args,
+            min_size=1,
+            max_size=8,
+            statement_cache_size=STATEMENT_CACHE_SIZE
+        )
+    
+    async def close(self):
+        """Close the connection pool"""
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+    
+    async def _run(self, query: str, params=None, max_rows: Optional[int] = None):
+        """Execute a query on a pooled connection and return (columns, rows, truncated)"""
+        async with self.pool.acquire() as conn:
+            stmt = await conn.prepare(query)
+            columns = [attr.name for attr in stmt.get_attributes()]
+            if max_rows is None:
+                records = await stmt.fetch(*(params or ()))
+                truncated = False
+            else:
+                # Server-side cursor: only max_rows + 1 rows ever leave the database
+                async with conn.transaction(readonly=True):
+                    cursor = await stmt.cursor(*(params or ()))
+                    records = await cursor.fetch(max_rows + 1)
+                truncated = len(records) > max_rows
+                records = records[:max_rows]
+        return columns, [tuple(record) for record in records], truncated
         
-    def execute_query(self, query: str) -> Dict[str, Any]:
-        """Execute SQL query through Docker"""
+    async def execute_query(self, query: str, params=None, max_rows: Optional[int] = None) -> Dict[str, Any]:
+        """Execute SQL query through the PostgreSQL connection pool"""
         try:
-            cmd = [
-                "docker", "exec", self.db_config["container"],
-                "psql", "-U", self.db_config["user"], "-d", self.db_config["database"],
-                "-c", query
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            try:
+                columns, rows, truncated = await self._run(query, params, max_rows)
+            except (asyncpg.ConnectionDoesNotExistError, ConnectionResetError):
+                # Connection dropped (server restart, idle timeout): the pool replaces it, retry once
+                columns, rows, truncated = await self._run(query, params, max_rows)
             
-            if result.returncode == 0:
-                return {
-                    "success": True,
-                    "data": result.stdout,
-                    "query": query
-                }
-            else:
-                return {
-                    "success": False,
-                    "error": result.stderr,
-                    "query": query
-                }
-        except Exception as e:
+            result = {
+                "success": True,
+                "columns": columns,
+                "rows": rows,
+                "row_count": len(rows),
+                "query": query
+            }
+            if truncated:
+                result["truncated"] = True
+                result["max_rows"] = max_rows
+            return result
+        except DB_ERRORS as e:
             return {
                 "success": False,
                 "error": str(e),
                 "query": query
             }
     
-    def get_schema_info(self) -> Dict[str, Any]:
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """Dispatch a call_tool request to its handler"""
+        handler = self._tool_handlers.get(tool_name) if isinstance(tool_name, str) else None
+        if handler is None:
+            return {"success": False, "error": f"Unknown tool: {tool_name}"}
+        return await handler(arguments)
+    
+    async def execute_prepared(self, name: str) -> Dict[str, Any]:
+        """Execute one of the PREPARED_QUERIES by name"""
+        if not self.enable_schema_cache:
+            return await self.execute_query(PREPARED_QUERIES[name])
+        return await self._cached(name, lambda: self.execute_query(PREPARED_QUERIES[name]))
+    
+    async def _cached(self, key: str, compute) -> Dict[str, Any]:
+        """TTL cache with single-flight: concurrent misses for a key await one ``compute``"""
+        entry = self._cache.get(key)
+        if entry is not None and time.monotonic() < entry[0]:
+            return entry[1]
+        
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            # Another task is already computing this key
+            return await asyncio.shield(inflight)
+        
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await compute()
+            if result.get("success"):
+                ttl = INTROSPECTION_CACHE_TTL * random.uniform(1 - INTROSPECTION_CACHE_JITTER, 1 + INTROSPECTION_CACHE_JITTER)
+                self._cache[key] = (time.monotonic() + ttl, result)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+    
+    async def get_schema_info(self) -> Dict[str, Any]:
         """Get database schema information"""
-        schema_query = """
-        SELECT 
-            table_name,
-            column_name,
-            data_type,
-            is_nullable
-        FROM information_schema.columns 
-        WHERE table_schema = 'public'
-        ORDER BY table_name, ordinal_position;
-        """
-        return self.execute_query(schema_query)
+        if not self.enable_schema_cache:
+            return await self.execute_query(PREPARED_QUERIES["per_schema"])
+        return await self._cached("per_schema", self._fetch_schema)
     
-    def get_table_counts(self) -> Dict[str, Any]:
-        """Get row counts for all tables"""
-        count_query = """
-        SELECT 
-            'exams' as tabla, COUNT(*) as registros FROM exams
-        UNION ALL
-        SELECT 
-            'questions' as tabla, COUNT(*) as registros FROM questions
-        UNION ALL
-        SELECT 
-            'answer_options' as tabla, COUNT(*) as registros FROM answer_options
-        UNION ALL
-        SELECT 
-            'question_explanations' as tabla, COUNT(*) as registros FROM question_explanations;
-        """
-        return self.execute_query(count_query)
+    async def _fetch_schema(self) -> Dict[str, Any]:
+        """Re-read information_schema only when the catalog version changed since the last fetch"""
+        version = await self.execute_query(PREPARED_QUERIES["per_schema_version"])
+        if not version["success"]:
+            return version
+        key = version["rows"][0]
+        if self._schema is not None and self._schema[0] == key:
+            return self._schema[1]
+        
+        result = await self.execute_query(PREPARED_QUERIES["per_schema"])
+        if result["success"]:
+            self._schema = (key, result)
+        return result
+    
+    async def get_table_counts(self) -> Dict[str, Any]:
+        """Get row counts for all tables (planner estimates from pg_class, no table scans)"""
+        return await self.execute_prepared("per_counts")
     
-    def query_convocatorias(self) -> Dict[str, Any]:
+    async def query_convocatorias(self) -> Dict[str, Any]:
         """Get all available convocatorias"""
-        query = """
-        SELECT DISTINCT convocatoria, COUNT(*) as preguntas
-        FROM exams e
-        JOIN questions q ON e.id = q.exam_id
-        WHERE convocatoria IS NOT NULL
-        GROUP BY convocatoria
-        ORDER BY convocatoria DESC;
-        """
-        return self.execute_query(query)
+        return await self.execute_prepared("per_convocatorias")
     
-    def query_temas(self) -> Dict[str, Any]:
+    async def query_temas(self) -> Dict[str, Any]:
         """Get all available topics/categories"""
-        query = """
-        SELECT categoria, COUNT(*) as preguntas
-        FROM questions
-        WHERE categoria IS NOT NULL
-        GROUP BY categoria
-        ORDER BY preguntas DESC;
-        """
-        return self.execute_query(query)
-    
-    def custom_query(self, sql: str) -> Dict[str, Any]:
-        """Execute custom SQL query"""
-        # Basic safety check - only allow SELECT queries
-        sql_trimmed = sql.strip().upper()
-        if not sql_trimmed.startswith('SELECT'):
+        return await self.execute_prepared("per_temas")
+    
+    async def custom_query(self, sql: str, params: List[Any] = None) -> Dict[str, Any]:
+        """Execute custom SQL query (optionally parameterized with $1, $2... placeholders)"""
+        # Safety check - only allow a single read-only SELECT (CTEs included)
+        error = validate_query_args(sql, params)
+        if error:
+            return {
+                "success": False,
+                "error": error,
+                "query": sql
+            }
+        
+        # Parameters may hold arrays (unhashable): key on their JSON encoding
+        key = (canonicalize_sql(sql), orjson.dumps(params, default=str) if params else None)
+        now = time.monotonic()
+        entry = self._query_cache.get(key)
+        if entry is not None and now < entry[0]:
+            self._query_cache.move_to_end(key)
+            return entry[1]
+        
+        result = await self.execute_query(sql, params=params or None, max_rows=CUSTOM_QUERY_MAX_ROWS)
+        if result.get("success"):
+            self._query_cache[key] = (now + QUERY_CACHE_TTL, result)
+            self._query_cache.move_to_end(key)
+            while len(self._query_cache) > QUERY_CACHE_MAX_ENTRIES:
+                self._query_cache.popitem(last=False)
+        return result
+    
+    async def custom_query_bulk(self, sql: str, params: List[Any] = None) -> Dict[str, Any]:
+        """Export a custom SELECT as CSV via COPY, without building per-row Python objects"""
+        error = validate_query_args(sql, params)
+        if error:
+            return {
+                "success": False,
+                "error": error,
+                "query": sql
+            }
+        
+        chunks = []
+        async def collect(data: bytes):
+            chunks.append(data)
+        
+        try:
+            # Same read-only transaction as custom_query: FOR UPDATE, nextval() or volatile
+            # functions accepted by the validator cannot lock rows or write here either
+            async with self.pool.acquire() as conn, conn.transaction(readonly=True):
+                # COPY wraps the query in parentheses, so only the trailing ';' is removed;
+                # the rest is exactly the text that validate_select accepted. The newlines keep
+                # a trailing "-- comment" from commenting out the closing parenthesis
+                await conn.copy_from_query(
+                    f"\n{sql.strip().rstrip(';')}\n", *(params or ()),
+                    output=collect, format='csv', header=True
+                )
+        except DB_ERRORS as e:
             return {
                 "success": False,
-                "error": "Only SELECT queries are allowed",
+                "error": str(e),
                 "query": sql
             }
         
-        return self.execute_query(sql)
+        return {
+            "success": True,
+            "format": "csv",
+            "data": b"".join(chunks).decode(),
+            "query": sql
+        }
 
-def main():
+def error_response(head: bytes, message: str) -> bytes:
+    """JSON-RPC error frame for a response whose prefix + id is ``head``"""
+    return b"".join((
+        head, b',"error":', orjson.dumps({"code": -1, "message": message}), b"}"
+    ))
+
+async def handle_request(mcp: PostgreSQLMCP, line: bytes) -> Optional[bytes]:
+    """Handle one JSON-RPC line and return the encoded response (None for unparseable input)"""
+    try:
+        request = orjson.loads(line)
+    except orjson.JSONDecodeError:
+        return None
+    
+    if not isinstance(request, dict):
+        return error_response(RESPONSE_PREFIX + b"null", "Invalid request")
+    
+    head = RESPONSE_PREFIX + orjson.dumps(request.get('id'), default=str)
+    method = request.get('method', '')
+    params = request.get('params') or {}
+    if not isinstance(params, dict):
+        return error_response(head, "params must be an object")
+    
+    if method == "list_tools":
+        return b"".join((head, RESULT_MID, LIST_TOOLS_RESULT, b"}"))
+    
+    if method == "call_tool":
+        tool_name = params.get('name')
+        arguments = params.get('arguments') or {}
+        if not isinstance(arguments, dict):
+            return error_response(head, "arguments must be an object")
+        
+        try:
+            result = await mcp.call_tool(tool_name, arguments)
+        except DB_ERRORS as e:
+            return error_response(head, str(e))
+        
+        return b"".join((
+            head, RESULT_MID,
+            TEXT_CONTENT_PREFIX, orjson.dumps(encode_json(result)), TEXT_CONTENT_SUFFIX,
+            b"}"
+        ))
+    
+    return head + b"}"
+
+def request_head(line: bytes) -> bytes:
+    """Response prefix + id for a raw request line (id null if it cannot be read)"""
+    try:
+        request = orjson.loads(line)
+    except orjson.JSONDecodeError:
+        request = None
+    request_id = request.get('id') if isinstance(request, dict) else None
+    return RESPONSE_PREFIX + orjson.dumps(request_id, default=str)
+
+async def process_line(mcp: PostgreSQLMCP, line: bytes, stdout):
+    """Handle a request and write its response as soon as it is ready"""
+    try:
+        response = await handle_request(mcp, line)
+    except Exception as e:
+        # A bug in a tool must not leave the client waiting forever for this id
+        traceback.print_exc(file=sys.stderr)
+        response = error_response(request_head(line), f"Internal error: {e}")
+    if response is not None:
+        stdout.write(response + b"\n")
+        stdout.flush()
+
+async def main():
     """Main MCP server function"""
     mcp = PostgreSQLMCP()
+    await mcp.connect()
     
-    while True:
-        try:
-            line = input()
-            if not line.strip():
-                continue
-                
+    stdout = sys.stdout.buffer
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=MAX_REQUEST_LINE)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    
+    # Each request runs as its own task so a slow query does not block the next ones
+    pending = set()
+    try:
+        while True:
             try:
-                request = json.loads(line)
-            except json.JSONDecodeError:
+                line = await reader.readline()
+            except ValueError:
+                # Oversized line: readline has already discarded it, so answer and keep serving
+                stdout.write(error_response(RESPONSE_PREFIX + b"null", "Parse error: request line too long") + b"\n")
+                stdout.flush()
+                continue
+            if not line:
+                break
+            if not line.strip():
                 continue
             
-            method = request.get('method', '')
-            params = request.get('params', {})
-            
-            response = {"jsonrpc": "2.0", "id": request.get('id')}
-            
-            if method == "list_tools":
-                response["result"] = {
-                    "tools": [
-                        {
-                            "name": "get_schema",
-                            "description": "Get database schema information"
-                        },
-                        {
-                            "name": "get_table_counts", 
-                            "description": "Get row counts for all tables"
-                        },
-                        {
-                            "name": "query_convocatorias",
-                            "description": "Get all available exam convocatorias with question counts"
-                        },
-                        {
-                            "name": "query_temas",
-                            "description": "Get all question topics/categories with counts"
-                        },
-                        {
-                            "name": "custom_query",
-                            "description": "Execute custom SELECT query",
-                            "inputSchema": {
-                                "type": "object",
-                                "properties": {
-                                    "sql": {
-                                        "type": "string",
-                                        "description": "SQL SELECT query to execute"
-                                    }
-                                },
-                                "required": ["sql"]
-                            }
-                        }
-                    ]
-                }
-            
-            elif method == "call_tool":
-                tool_name = params.get('name')
-                arguments = params.get('arguments', {})
-                
-                if tool_name == "get_schema":
-                    result = mcp.get_schema_info()
-                elif tool_name == "get_table_counts":
-                    result = mcp.get_table_counts()
-                elif tool_name == "query_convocatorias":
-                    result = mcp.query_convocatorias()
-                elif tool_name == "query_temas":
-                    result = mcp.query_temas()
-                elif tool_name == "custom_query":
-                    sql = arguments.get('sql', '')
-                    result = mcp.custom_query(sql)
-                else:
-                    result = {"success": False, "error": f"Unknown tool: {tool_name}"}
-                
-                response["result"] = {
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": json.dumps(result, indent=2, ensure_ascii=False)
-                        }
-                    ]
-                }
-            
-            print(json.dumps(response, ensure_ascii=False))
-            
-        except EOFError:
-            break
-        except KeyboardInterrupt:
-            break
-        except Exception as e:
-            error_response = {
-                "jsonrpc": "2.0",
-                "id": request.get('id') if 'request' in locals() else None,
-                "error": {
-                    "code": -1,
-                    "message": str(e)
-                }
-            }
-            print(json.dumps(error_response, ensure_ascii=False))
+            task = asyncio.create_task(process_line(mcp, line, stdout))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        
+        if pending:
+            await asyncio.gather(*pending)
+    finally:
+        await mcp.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
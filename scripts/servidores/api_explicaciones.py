@@ -4,58 +4,315 @@ API Flask simple para generar explicaciones con GPT-5
 Arquitectura: API separada en puerto 5000, visor web en puerto 8095
 """
 
-import json
+import asyncio
+import atexit
+import base64
+import gzip
+import hashlib
+import io
 import os
-import requests
 import logging
+import queue
+import random
+import shutil
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
-from flask import Flask, request, jsonify, send_file
+from functools import lru_cache
+
+import aiohttp
+import orjson
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+import psycopg2.pool
+from flask import Flask, Response, request, jsonify, send_from_directory
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
+from werkzeug.exceptions import NotFound
+from werkzeug.utils import secure_filename
 
 # Configuración
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', 'your-api-key-here')
+OPENAI_RESPONSES_URL = 'https://api.openai.com/v1/responses'
+GPT5_TIMEOUT = 300
+# Pool de conexiones keep-alive hacia OpenAI y reintentos ante errores transitorios
+GPT5_POOL_SIZE = 32
+GPT5_MAX_REINTENTOS = 5
+GPT5_BACKOFF = 0.5
+# Tope de espera cuando OpenAI pide esperar con Retry-After (segundos)
+GPT5_MAX_RETRY_AFTER = 60
+GPT5_ESTADOS_REINTENTABLES = {429, 500, 502, 503, 504}
+# Límites hacia OpenAI para todo el proceso: llamadas en vuelo y peticiones por minuto
+GPT5_CONCURRENCIA = 16
+GPT5_PETICIONES_MINUTO = 180
+# Llamadas simultáneas a GPT-5 como máximo dentro de un mismo lote
+GPT5_BATCH_CONCURRENCIA = 8
+# Preguntas por petición como máximo en /generar-explicacion-batch
+MAX_LOTE = 50
 EXPLICACIONES_JSON_PATH = '../../data/json/explicaciones.json'
+DATOS_JSON_PATH = '../../data/json/data_unificado_con_duplicados.json'
+# Como mucho un backup por archivo en este intervalo (segundos), salvo los forzados
+BACKUP_INTERVALO = 600
+# Tamaño aproximado de cada bloque al enviar /explicaciones en streaming
+STREAM_CHUNK_SIZE = 64 * 1024
+# Espera del escritor en segundo plano para agrupar ráfagas de cambios en una sola escritura
+ESCRITURA_DEBOUNCE = 0.2
 IMAGES_DIR = 'src/web/images'
+# PostgreSQL (mismas variables que api_postgresql.py): DATABASE_URL o DATABASE_HOST/PORT/NAME/USER/PASSWORD
+DATABASE_URL = os.getenv('DATABASE_URL')
+DB_CONFIG = {
+    'host': os.getenv('DATABASE_HOST', 'localhost'),
+    'port': int(os.getenv('DATABASE_PORT', 5432)),
+    'database': os.getenv('DATABASE_NAME', 'per_exams'),
+    'user': os.getenv('DATABASE_USER', 'per_user'),
+    'password': os.getenv('DATABASE_PASSWORD', 'per_password_change_me')
+}
+PG_POOL_MIN = 1
+PG_POOL_MAX = 10
+# Una base de datos colgada no debe bloquear los hilos del worker: límite de conexión (s),
+# de cada consulta (ms) y de la espera por un hueco del pool (s)
+PG_CONNECT_TIMEOUT = 5
+PG_STATEMENT_TIMEOUT_MS = 5000
+PG_ESPERA_POOL = 5
+# Tras tantos fallos seguidos de PostgreSQL se deja de intentar durante la pausa (s)
+PG_CIRCUITO_FALLOS = 3
+PG_CIRCUITO_PAUSA = 30
+# Segundos que se reutiliza la respuesta de /api/examenes (los exámenes cambian muy de vez en cuando)
+EXAMENES_CACHE_TTL = 60
+EXTENSIONES_IMAGEN = frozenset({'png', 'jpg', 'jpeg', 'gif', 'webp'})
+# Límite de las imágenes subidas (igual que client_max_body_size de nginx) y de cualquier petición:
+# /guardar-datos recibe el JSON completo de preguntas, de ahí el margen
+MAX_IMAGEN_BYTES = 10 * 1024 * 1024
+MAX_PETICION_BYTES = 64 * 1024 * 1024
+UPLOAD_BUFFER = 1024 * 1024
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+_ultimo_backup = {}
+# Huella (blake2b) del contenido guardado en el último backup de cada archivo
+_huella_backup = {}
+# ((inode, mtime, tamaño), huella) del último archivo publicado por nosotros: el rename crea un
+# inode nuevo, así que el contenido se reconoce por la huella mientras nadie edite el archivo
+_version_publicada = {}
+# Directorios donde os.link ha fallado y los backups se hacen copiando
+_backup_por_copia = set()
+
+def escribir_json_atomico(path, datos, forzar_backup=False):
+    """Escribir JSON en un temporal y renombrarlo sobre ``path``: nunca queda a medio escribir"""
+    tmp_path, huella = _escribir_json_temporal(path, datos)
+    _publicar_json_temporal(tmp_path, huella, path, forzar_backup)
+
+def _escribir_json_temporal(path, datos):
+    """Serializar ``datos`` en un temporal junto a ``path`` y devolver su ruta y la huella del contenido"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp.{threading.get_ident()}"
+    contenido = orjson.dumps(datos, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    with open(tmp_path, 'wb') as f:
+        f.write(contenido)
+        # Datos en disco antes del rename: tras un corte nunca se publica un archivo vacío
+        f.flush()
+        os.fsync(f.fileno())
+    return tmp_path, hashlib.blake2b(contenido, digest_size=16).digest()
+
+def marca_tiempo(con_microsegundos=False):
+    """Marca de tiempo local para nombres de archivo: YYYYmmdd_HHMMSS[_ffffff]"""
+    ns = time.time_ns()
+    marca = time.strftime('%Y%m%d_%H%M%S', time.localtime(ns // 1_000_000_000))
+    return f"{marca}_{ns // 1000 % 1_000_000:06d}" if con_microsegundos else marca
+
+def _publicar_json_temporal(tmp_path, huella, path, forzar_backup=False):
+    """Renombrar el temporal sobre ``path``, con backup rotativo del archivo anterior"""
+    # Backup rotativo: el archivo anterior se conserva con un hard link (sin copiar datos)
+    ahora = time.monotonic()
+    version = _version_archivo(path)
+    # Huella del archivo actual si es el que publicamos (None si no existe o se editó por fuera)
+    publicada = _version_publicada.get(path)
+    huella_actual = publicada[1] if publicada is not None and publicada[0] == version else None
+    # Un contenido igual al del último backup no se vuelve a copiar (ni forzando)
+    if version is not None and (huella_actual is None or huella_actual != _huella_backup.get(path)) and \
+            (forzar_backup or ahora - _ultimo_backup.get(path, -BACKUP_INTERVALO) >= BACKUP_INTERVALO):
+        backup_path = f"{path}.backup_{marca_tiempo(con_microsegundos=True)}"
+        directorio = os.path.dirname(os.path.abspath(path))
+        if directorio not in _backup_por_copia:
+            try:
+                os.link(path, backup_path)
+            except OSError as e:
+                # Sistema de archivos sin hard links (p. ej. algunos volúmenes montados): en ese
+                # directorio no se vuelve a intentar y se copia (copy2 ya usa sendfile en Linux)
+                logger.warning(f"⚠️ No se pudo crear el backup con hard link ({e}), se copiará el archivo")
+                _backup_por_copia.add(directorio)
+        if directorio in _backup_por_copia:
+            shutil.copy2(path, backup_path)
+        _ultimo_backup[path] = ahora
+        _huella_backup[path] = huella_actual
+        logger.info(f"📋 Backup creado: {backup_path}")
+    
+    os.replace(tmp_path, path)
+    _version_publicada[path] = (_version_archivo(path), huella)
+
+def _version_archivo(path):
+    """(inode, mtime, tamaño) de ``path``, o None si no existe"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
 # Funciones para manejar el archivo JSON de explicaciones
-def load_explicaciones():
-    """Cargar explicaciones desde el archivo JSON"""
+# El JSON se mantiene en memoria indexado por hash_pregunta y solo se vuelve a parsear si su
+# mtime cambia (edición externa del archivo). Las escrituras sustituyen el dict completo
+# (copy-on-write) bajo _explicaciones_lock, así los lectores siempre ven una instantánea
+# consistente sin necesidad de bloquear.
+_explicaciones = None
+_explicaciones_mtime = None
+_explicaciones_lock = threading.Lock()
+# Última instantánea que coincide con el contenido del archivo (cargada o escrita por nosotros)
+_explicaciones_en_disco = None
+
+def _mtime_explicaciones():
+    """mtime en ns del archivo JSON (None si no existe)"""
+    try:
+        return os.stat(EXPLICACIONES_JSON_PATH).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def _leer_explicaciones_json():
+    """Cargar explicaciones desde el archivo JSON (None si no se pudo leer)"""
     try:
         if os.path.exists(EXPLICACIONES_JSON_PATH):
-            with open(EXPLICACIONES_JSON_PATH, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with open(EXPLICACIONES_JSON_PATH, 'rb') as f:
+                return orjson.loads(f.read())
         return {}
     except Exception as e:
         logger.error(f"Error cargando explicaciones: {e}")
-        return {}
+        return None
 
-def save_explicaciones(explicaciones):
-    """Guardar explicaciones en el archivo JSON"""
+def load_explicaciones():
+    """Instantánea de las explicaciones {hash: explicación}; no debe modificarse"""
+    global _explicaciones, _explicaciones_mtime, _explicaciones_en_disco
+    mtime = _mtime_explicaciones()
+    if _explicaciones is None or mtime != _explicaciones_mtime:
+        with _explicaciones_lock:
+            if _explicaciones is None or mtime != _explicaciones_mtime:
+                explicaciones = _leer_explicaciones_json()
+                if explicaciones is None:
+                    return _explicaciones or {}
+                _explicaciones, _explicaciones_mtime = explicaciones, mtime
+                _explicaciones_en_disco = explicaciones
+    return _explicaciones
+
+def _escribir_explicaciones_json(explicaciones, forzar_backup=False):
+    """Volcar las explicaciones al archivo JSON"""
+    global _explicaciones_mtime, _explicaciones_en_disco
+    # Guardado sin cambios (p. ej. el visor reenvía el mismo dict): las instantáneas son inmutables,
+    # así que basta compararlas para evitar serializar, escribir y hacer backup. Si el archivo se
+    # editó por fuera (mtime distinto) se reescribe igualmente
+    mtime = _mtime_explicaciones()
+    if mtime is not None and mtime == _explicaciones_mtime and explicaciones == _explicaciones_en_disco:
+        logger.info("ℹ️ Explicaciones sin cambios, no se reescribe el archivo")
+        return
     try:
-        # Asegurar que el directorio existe
-        os.makedirs(os.path.dirname(EXPLICACIONES_JSON_PATH), exist_ok=True)
-        
-        with open(EXPLICACIONES_JSON_PATH, 'w', encoding='utf-8') as f:
-            json.dump(explicaciones, f, ensure_ascii=False, indent=2)
+        # La serialización va fuera del lock; el rename y el nuevo mtime, dentro, para que
+        # load_explicaciones no tome nuestra propia escritura por una edición externa
+        tmp_path, huella = _escribir_json_temporal(EXPLICACIONES_JSON_PATH, explicaciones)
+        with _explicaciones_lock:
+            _publicar_json_temporal(tmp_path, huella, EXPLICACIONES_JSON_PATH, forzar_backup)
+            _explicaciones_mtime = _mtime_explicaciones()
+            _explicaciones_en_disco = explicaciones
         logger.info(f"✅ Explicaciones guardadas en {EXPLICACIONES_JSON_PATH}")
     except Exception as e:
         logger.error(f"Error guardando explicaciones: {e}")
 
+# Las peticiones solo encolan la instantánea nueva; un hilo escritor persiste la última
+_cola_escritura = queue.Queue()
+_escritor = None
+_escritor_lock = threading.Lock()
+
+def _escritor_explicaciones():
+    """Persistir la última instantánea encolada, agrupando ráfagas en una sola escritura"""
+    while True:
+        explicaciones, forzar_backup = _cola_escritura.get()
+        time.sleep(ESCRITURA_DEBOUNCE)
+        agrupadas = 1
+        while True:
+            try:
+                explicaciones, forzar = _cola_escritura.get_nowait()
+            except queue.Empty:
+                break
+            forzar_backup = forzar_backup or forzar
+            agrupadas += 1
+        _escribir_explicaciones_json(explicaciones, forzar_backup)
+        for _ in range(agrupadas):
+            _cola_escritura.task_done()
+
+def _encolar_escritura(explicaciones, forzar_backup=False):
+    """Programar la escritura de ``explicaciones`` en el hilo escritor (arrancándolo si hace falta)"""
+    global _escritor
+    with _escritor_lock:
+        if _escritor is None:
+            _escritor = threading.Thread(target=_escritor_explicaciones, name='explicaciones-writer', daemon=True)
+            _escritor.start()
+            atexit.register(flush_explicaciones)
+    _cola_escritura.put((explicaciones, forzar_backup))
+
+def flush_explicaciones():
+    """Esperar a que todas las escrituras encoladas estén en disco"""
+    _cola_escritura.join()
+
+def _modificar_explicaciones(cambio):
+    """Aplicar ``cambio`` a una copia del dict, publicarla y persistirla"""
+    global _explicaciones
+    load_explicaciones()
+    with _explicaciones_lock:
+        explicaciones = dict(_explicaciones or {})
+        resultado = cambio(explicaciones)
+        _explicaciones = explicaciones
+        _encolar_escritura(explicaciones)
+    return resultado
+
+def save_explicaciones(explicaciones, forzar_backup=False):
+    """Reemplazar todas las explicaciones"""
+    global _explicaciones
+    with _explicaciones_lock:
+        _explicaciones = dict(explicaciones)
+        _encolar_escritura(_explicaciones, forzar_backup)
+
+def guardar_explicacion(hash_pregunta, explicacion):
+    """Guardar (o sustituir) la explicación de una pregunta"""
+    _modificar_explicaciones(lambda actuales: actuales.update({hash_pregunta: explicacion}))
+
+def actualizar_explicacion(hash_pregunta, campos):
+    """Añadir ``campos`` a una explicación existente; False si no existe"""
+    def cambio(actuales):
+        if hash_pregunta not in actuales:
+            return False
+        actuales[hash_pregunta] = {**actuales[hash_pregunta], **campos}
+        return True
+    return _modificar_explicaciones(cambio)
+
+def borrar_explicacion_guardada(hash_pregunta):
+    """Borrar la explicación de una pregunta; False si no existía"""
+    return _modificar_explicaciones(lambda actuales: actuales.pop(hash_pregunta, None) is not None)
+
 def generate_hash_pregunta(pregunta_data):
     """Generar hash único para la pregunta (mismo algoritmo que el JSON de preguntas)"""
-    import hashlib
-    
+    textos = tuple(opcion.get('texto', '') for opcion in pregunta_data['opciones'])
+    return _hash_pregunta(pregunta_data['enunciado'], textos)
+
+@lru_cache(maxsize=1024)
+def _hash_pregunta(enunciado, textos_opciones):
+    """Hash de una pregunta ya reducida a texto (cacheado: el visor repite las mismas preguntas)"""
     # Normalizar enunciado
-    enunciado_norm = " ".join(pregunta_data['enunciado'].lower().split())
+    enunciado_norm = " ".join(enunciado.lower().split())
     
     # Normalizar opciones (solo texto, ordenado)
     opciones_norm = []
-    for opcion in pregunta_data['opciones']:
-        texto_norm = " ".join(opcion.get('texto', '').lower().split())
+    for texto in textos_opciones:
+        texto_norm = " ".join(texto.lower().split())
         if texto_norm:  # Solo añadir si no está vacío
             opciones_norm.append(texto_norm)
     
@@ -65,6 +322,15 @@ def generate_hash_pregunta(pregunta_data):
     # Generar hash SHA-256 truncado (mismo algoritmo)
     return hashlib.sha256(contenido.encode('utf-8')).hexdigest()[:16]
 
+def resolver_hash_pregunta(pregunta_data):
+    """Usar el hash_pregunta que ya viene en los datos o generarlo si falta"""
+    hash_pregunta = pregunta_data.get('hash_pregunta', '')
+    if not hash_pregunta:
+        # Fallback: generar hash si no viene en los datos
+        hash_pregunta = generate_hash_pregunta(pregunta_data)
+        logger.warning(f"⚠️ Hash no encontrado en datos, generado: {hash_pregunta}")
+    return hash_pregunta
+
 def generate_image_png_with_gpt5(image_prompt):
     """Generar imagen PNG usando GPT-5 con el prompt existente"""
     try:
@@ -99,20 +365,19 @@ Genera la imagen como base64 PNG y devuélvela en el campo image_png_base64."""
         
         # Parsear JSON de GPT-5
         try:
-            image_data = json.loads(gpt5_response)
+            image_data = orjson.loads(gpt5_response)
             base64_image = image_data.get('image_png_base64', '')
             
             if not base64_image or not base64_image.startswith('data:image/png;base64,'):
                 raise Exception("GPT-5 no generó imagen PNG válida")
             
             # Decodificar base64
-            import base64
             image_bytes = base64.b64decode(base64_image.split(',')[1])
             
             logger.info("✅ Imagen PNG generada correctamente con GPT-5")
             return image_bytes
             
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"❌ Error parseando JSON de imagen: {e}")
             raise Exception("Respuesta de GPT-5 no es JSON válido para imagen")
             
@@ -126,7 +391,7 @@ def save_image_png_to_server(image_data, hash_pregunta):
     os.makedirs(IMAGES_DIR, exist_ok=True)
     
     # Generar nombre de archivo único
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    timestamp = marca_tiempo()
     filename = f"{hash_pregunta}_{timestamp}.png"
     filepath = os.path.join(IMAGES_DIR, filename)
     
@@ -139,8 +404,27 @@ def save_image_png_to_server(image_data, hash_pregunta):
     # Retornar URL relativa
     return f"images/{filename}"
 
+class ORJSONProvider(JSONProvider):
+    """Serialización JSON de Flask (jsonify, request.get_json) con orjson"""
+    option = orjson.OPT_NON_STR_KEYS
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=self.option, default=str).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, option=self.option, default=str),
+            mimetype='application/json'
+        )
+
 # Crear app Flask
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
+app.config['MAX_CONTENT_LENGTH'] = MAX_PETICION_BYTES
 
 # Configurar CORS explícitamente
 CORS(app, origins=['http://localhost:8095'], 
@@ -148,9 +432,165 @@ CORS(app, origins=['http://localhost:8095'],
      allow_headers=['Content-Type'],
      supports_credentials=True)
 
-def call_gpt5(prompt):
-    """Llama a GPT-5 usando requests (como en el test exitoso)"""
-    url = 'https://api.openai.com/v1/responses'
+# Bucle de eventos compartido por todas las llamadas a GPT-5: las vistas Flask (un hilo por
+# petición) le envían corrutinas, así las llamadas en vuelo comparten bucle y sesión HTTP
+_gpt5_loop = None
+_gpt5_loop_lock = threading.Lock()
+_gpt5_session = None
+# Llamadas a GPT-5 en vuelo por hash_pregunta (solo se toca desde el bucle de GPT-5)
+_gpt5_en_vuelo = {}
+
+def _get_gpt5_loop():
+    """Arrancar (una sola vez por proceso) el hilo con el bucle de eventos de GPT-5"""
+    global _gpt5_loop
+    with _gpt5_loop_lock:
+        if _gpt5_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name='gpt5-loop', daemon=True).start()
+            _gpt5_loop = loop
+            atexit.register(_cerrar_gpt5_session)
+    return _gpt5_loop
+
+def _cerrar_gpt5_session():
+    """Cerrar las conexiones keep-alive del pool al terminar el proceso"""
+    if _gpt5_session is not None:
+        asyncio.run_coroutine_threadsafe(_gpt5_session.close(), _gpt5_loop).result(timeout=5)
+
+def _get_gpt5_session():
+    """Sesión aiohttp única, creada dentro del bucle de GPT-5 la primera vez que se usa"""
+    global _gpt5_session
+    if _gpt5_session is None:
+        connector = aiohttp.TCPConnector(
+            limit=GPT5_POOL_SIZE,
+            keepalive_timeout=60,
+            ttl_dns_cache=300
+        )
+        _gpt5_session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=GPT5_TIMEOUT)
+        )
+    return _gpt5_session
+
+class LimitadorTasa:
+    """Cubo de tokens: como mucho `tasa` peticiones por `periodo` segundos (solo desde el bucle de GPT-5)"""
+
+    def __init__(self, tasa, periodo=60.0):
+        self.capacidad = tasa
+        self.ritmo = tasa / periodo
+        self.tokens = float(tasa)
+        self.ultimo = time.monotonic()
+
+    async def adquirir(self):
+        """Esperar hasta que haya un token disponible y consumirlo"""
+        while True:
+            ahora = time.monotonic()
+            self.tokens = min(self.capacidad, self.tokens + (ahora - self.ultimo) * self.ritmo)
+            self.ultimo = ahora
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.ritmo)
+
+_gpt5_semaforo = asyncio.Semaphore(GPT5_CONCURRENCIA)
+_gpt5_limitador = LimitadorTasa(GPT5_PETICIONES_MINUTO)
+
+def _espera_reintento(retry_after, intento):
+    """Segundos antes del siguiente intento: Retry-After si OpenAI lo envía, si no backoff con jitter"""
+    try:
+        return min(float(retry_after), GPT5_MAX_RETRY_AFTER)
+    except (TypeError, ValueError):
+        return GPT5_BACKOFF * 2 ** intento + random.uniform(0, GPT5_BACKOFF)
+
+def call_gpt5(prompt, on_delta=None):
+    """Llama a GPT-5 desde código síncrono, esperando al bucle compartido"""
+    return asyncio.run_coroutine_threadsafe(call_gpt5_async(prompt, on_delta), _get_gpt5_loop()).result()
+
+def generar_explicacion_gpt5(clave, prompt):
+    """Genera y guarda la explicación de ``clave`` desde código síncrono (ver call_gpt5_unico)"""
+    return asyncio.run_coroutine_threadsafe(call_gpt5_unico(clave, prompt), _get_gpt5_loop()).result()
+
+def call_gpt5_batch(claves, prompts):
+    """Genera y guarda varias explicaciones a la vez; devuelve los pares (respuesta, explicación) en el mismo orden"""
+    return asyncio.run_coroutine_threadsafe(call_gpt5_batch_async(claves, prompts), _get_gpt5_loop()).result()
+
+async def call_gpt5_batch_async(claves, prompts):
+    """Lanza las llamadas en paralelo con como mucho GPT5_BATCH_CONCURRENCIA en vuelo"""
+    semaforo = asyncio.Semaphore(GPT5_BATCH_CONCURRENCIA)
+    
+    async def una(clave, prompt):
+        async with semaforo:
+            return await call_gpt5_unico(clave, prompt)
+    
+    return await asyncio.gather(*(una(clave, prompt) for clave, prompt in zip(claves, prompts)))
+
+async def call_gpt5_unico(clave, prompt, on_delta=None):
+    """Genera y guarda la explicación de ``clave``; si ya hay una generación en vuelo se espera a esa
+
+    Devuelve (respuesta de GPT-5, explicación guardada o None si no es JSON válido). Solo la tarea
+    que llama a GPT-5 guarda el resultado: las peticiones que se unen a ella únicamente lo leen.
+    """
+    tarea = _gpt5_en_vuelo.get(clave)
+    if tarea is None:
+        tarea = asyncio.ensure_future(_generar_y_guardar(clave, prompt, on_delta))
+        _gpt5_en_vuelo[clave] = tarea
+        tarea.add_done_callback(lambda _: _gpt5_en_vuelo.pop(clave, None))
+    else:
+        logger.info(f"🔗 Ya hay una llamada a GPT-5 en curso para {clave}, esperando su respuesta")
+    # shield: si un cliente se desconecta no se cancela la llamada que comparten los demás
+    return await asyncio.shield(tarea)
+
+async def _generar_y_guardar(clave, prompt, on_delta):
+    """Llamar a GPT-5 y guardar la explicación dentro de la misma tarea (no depende del cliente)"""
+    gpt5_response = await call_gpt5_async(prompt, on_delta)
+    if not gpt5_response:
+        return None, None
+    # El guardado escribe en disco: se hace en un hilo para no frenar el resto de llamadas del bucle
+    resultado = await asyncio.get_running_loop().run_in_executor(None, guardar_respuesta_gpt5, clave, gpt5_response)
+    return gpt5_response, resultado
+
+async def _lineas_stream(contenido):
+    """Líneas del cuerpo sin límite de longitud
+
+    Iterar ``response.content`` corta las líneas al doble de ``read_bufsize`` (ValueError), y el
+    evento ``response.completed`` repite la respuesta entera en una sola línea.
+    """
+    buffer = bytearray()
+    async for trozo in contenido.iter_any():
+        # Solo se busca el salto de línea en lo recién llegado (y lo pendiente sin salto ya se revisó)
+        buscar_desde = len(buffer)
+        buffer += trozo
+        inicio = 0
+        fin = buffer.find(b'\n', buscar_desde)
+        while fin != -1:
+            yield bytes(buffer[inicio:fin + 1])
+            inicio = fin + 1
+            fin = buffer.find(b'\n', inicio)
+        del buffer[:inicio]
+    if buffer:
+        yield bytes(buffer)
+
+async def _leer_stream_gpt5(response, on_delta):
+    """Recorre los eventos SSE de la Responses API y concatena los fragmentos de texto"""
+    texto = io.StringIO()
+    async for linea in _lineas_stream(response.content):
+        if not linea.startswith(b'data:'):
+            continue
+        evento = orjson.loads(linea[5:])
+        tipo = evento.get('type')
+        if tipo == 'response.output_text.delta':
+            texto.write(evento['delta'])
+            if on_delta is not None:
+                on_delta(evento['delta'])
+        elif tipo == 'response.completed':
+            return texto.getvalue()
+        elif tipo in ('response.failed', 'response.incomplete', 'error'):
+            logger.error(f"❌ GPT-5 cortó el stream ({tipo}): {evento}")
+            return None
+    logger.error("❌ El stream de GPT-5 terminó sin evento response.completed")
+    return None
+
+async def call_gpt5_async(prompt, on_delta=None):
+    """Llama a GPT-5 con aiohttp en modo streaming; on_delta recibe cada fragmento de texto"""
     headers = {
         'Content-Type': 'application/json',
         'Authorization': f'Bearer {OPENAI_API_KEY}'
@@ -158,48 +598,65 @@ def call_gpt5(prompt):
     
     request_body = {
         'model': 'gpt-5-2025-08-07',
-        'input': prompt
+        'input': prompt,
+        'stream': True
     }
     
     logger.info("🚀 Llamando a GPT-5 desde API Flask")
     
+    # Si ya se reenvió texto al cliente no se reintenta: el nuevo intento repetiría los fragmentos
+    emitido = False
+    if on_delta is not None:
+        reenviar = on_delta
+        
+        def on_delta(delta):
+            nonlocal emitido
+            emitido = True
+            reenviar(delta)
+    
     try:
-        response = requests.post(url, headers=headers, json=request_body, timeout=300)
-        
-        if response.status_code == 200:
-            data = response.json()
-            # Extraer texto como en el test exitoso de Node.js
-            text_content = data['output'][1]['content'][0]['text']
-            logger.info("✅ GPT-5 respondió correctamente")
-            logger.info("📤 RESPUESTA DE GPT-5:")
-            logger.info("=" * 80)
-            logger.info(text_content)
-            logger.info("=" * 80)
-            return text_content
-        elif response.status_code == 401:
-            logger.error(f"❌ API Key inválida o expirada: {response.text}")
-            return None
-        else:
-            logger.error(f"❌ Error GPT-5: {response.status_code} - {response.text}")
-            return None
+        for intento in range(GPT5_MAX_REINTENTOS + 1):
+            ultimo_intento = intento == GPT5_MAX_REINTENTOS
+            retry_after = None
+            try:
+                # El semáforo solo se retiene durante la petición, no durante la espera entre intentos
+                async with _gpt5_semaforo:
+                    await _gpt5_limitador.adquirir()
+                    async with _get_gpt5_session().post(OPENAI_RESPONSES_URL, headers=headers, json=request_body) as response:
+                        if response.status == 200:
+                            text_content = await _leer_stream_gpt5(response, on_delta)
+                            if text_content is None:
+                                return None
+                            logger.info("✅ GPT-5 respondió correctamente")
+                            logger.info("📤 RESPUESTA DE GPT-5:")
+                            logger.info("=" * 80)
+                            logger.info(text_content)
+                            logger.info("=" * 80)
+                            return text_content
+                        elif response.status == 401:
+                            logger.error(f"❌ API Key inválida o expirada: {await response.text()}")
+                            return None
+                        elif response.status not in GPT5_ESTADOS_REINTENTABLES or ultimo_intento:
+                            logger.error(f"❌ Error GPT-5: {response.status} - {await response.text()}")
+                            return None
+                        retry_after = response.headers.get('Retry-After')
+                        logger.warning(f"⚠️ GPT-5 respondió {response.status}, reintentando ({intento + 1}/{GPT5_MAX_REINTENTOS})")
+            except aiohttp.ClientConnectionError as e:
+                if ultimo_intento or emitido:
+                    raise
+                logger.warning(f"⚠️ Conexión con GPT-5 fallida ({e}), reintentando ({intento + 1}/{GPT5_MAX_REINTENTOS})")
+            await asyncio.sleep(_espera_reintento(retry_after, intento))
             
-    except requests.Timeout:
+    except asyncio.TimeoutError:
         logger.error(f"❌ Timeout llamando a GPT-5 (300 segundos): GPT-5 está tardando mucho en responder")
         return None
     except Exception as e:
         logger.error(f"❌ Excepción llamando a GPT-5: {e}")
         return None
 
-def create_prompt(pregunta_data):
-    """Crear prompt exactamente igual que en el test exitoso"""
-    opciones_marcadas = []
-    for opt in pregunta_data['opciones']:
-        marca = ' ✓ CORRECTA' if opt['letra'] == pregunta_data['respuesta_correcta'] else ''
-        opciones_marcadas.append(f"{opt['letra']}) {opt['texto']}{marca}")
-    
-    opciones_text = '\n'.join(opciones_marcadas)
-    
-    return f"""Eres un profesor experto en náutica de recreo. Explicas con claridad, en español neutro, con precisión técnica y sin tonterías.
+# Partes fijas del prompt de explicación (mismo texto que en el test exitoso); create_prompt
+# solo intercala el enunciado, las opciones y la respuesta correcta
+_PROMPT_CABECERA = """Eres un profesor experto en náutica de recreo. Explicas con claridad, en español neutro, con precisión técnica y sin tonterías.
 
 Usuario:
 Te paso una pregunta de test con opciones y la opción correcta marcada.
@@ -222,21 +679,24 @@ Tarea:
    - Sin elementos decorativos innecesarios
 
 FORMATO DE SALIDA (JSON estrictamente):
-{{
+{
   "markdown": "…explicación en Markdown con encabezados y listas…",
   "diagram_svg": "<svg …>…</svg>" | null,
   "image_prompt": "Prompt detallado para generador de imágenes que describa una ilustración técnica náutica isométrica, estilo manual marítimo, colores grises y azules suaves, líneas claras, sombras simples, fondo beige claro, aspecto profesional y minimalista"
-}}
+}
 
 Contenido:
 <<PREGUNTA>>
-{pregunta_data['enunciado']}
+"""
+_PROMPT_OPCIONES = """
 
 OPCIONES:
-{opciones_text}
+"""
+_PROMPT_CORRECTA = """
 
 <<CORRECTA>>
-{pregunta_data['respuesta_correcta']}
+"""
+_PROMPT_PIE = """
 
 Estilo:
 - Breve, didáctico, sin relleno.
@@ -244,17 +704,71 @@ Estilo:
 - No inventes datos fuera del temario.
 - Si no hace falta diagrama, devuelve diagram_svg = null."""
 
-@app.route('/generar-explicacion', methods=['POST', 'OPTIONS'])
+def create_prompt(pregunta_data):
+    """Crear prompt exactamente igual que en el test exitoso"""
+    correcta = pregunta_data['respuesta_correcta']
+    opciones_text = '\n'.join(
+        f"{opt['letra']}) {opt['texto']}{' ✓ CORRECTA' if opt['letra'] == correcta else ''}"
+        for opt in pregunta_data['opciones']
+    )
+    
+    return ''.join((
+        _PROMPT_CABECERA, pregunta_data['enunciado'],
+        _PROMPT_OPCIONES, opciones_text,
+        _PROMPT_CORRECTA, correcta,
+        _PROMPT_PIE
+    ))
+
+def guardar_respuesta_gpt5(hash_pregunta, gpt5_response):
+    """Convertir el JSON devuelto por GPT-5 al formato del visor y guardarlo (None si no es JSON válido)"""
+    # Parsear JSON de GPT-5
+    try:
+        explicacion_data = orjson.loads(gpt5_response)
+    except orjson.JSONDecodeError as e:
+        logger.error(f"❌ Error parseando JSON de GPT-5: {e}")
+        logger.error(f"📝 Respuesta recibida: {gpt5_response}")
+        return None
+    
+    # Convertir al formato esperado por el visor (nuevo formato más simple)
+    resultado = {
+        'id': f"exp_{int(time.time())}",
+        'resumen_pregunta': 'Explicación generada por GPT-5',
+        'opciones': [],  # Se llenará desde el markdown
+        'conclusion': explicacion_data.get('markdown', 'Explicación no disponible'),
+        'recursos_visuales': [],
+        'nivel_dificultad': 'Intermedio',
+        'fecha_creacion': datetime.now().isoformat(),
+        'llm_utilizado': 'openai-gpt-5-flask-api',
+        'image_prompt': explicacion_data.get('image_prompt', '')  # Campo para generador de imágenes
+    }
+    
+    # Añadir diagrama SVG si existe
+    if explicacion_data.get('diagram_svg') and explicacion_data['diagram_svg'] != 'null':
+        svg_content = explicacion_data['diagram_svg'].strip()
+        if svg_content and svg_content != 'null':
+            resultado['recursos_visuales'].append({
+                'tipo': 'svg',
+                'descripcion': 'Diagrama explicativo generado por IA',
+                'svg_content': svg_content,
+                'texto_alternativo': 'Diagrama que ilustra la respuesta correcta'
+            })
+            logger.info("✅ SVG diagrama añadido a recursos visuales")
+        else:
+            logger.info("ℹ️ SVG no generado (null o vacío)")
+    else:
+        logger.info("ℹ️ No se generó diagrama SVG")
+    
+    resultado['hash_pregunta'] = hash_pregunta
+    
+    # Guardar nueva explicación (en memoria y en el archivo JSON)
+    guardar_explicacion(hash_pregunta, resultado)
+    
+    logger.info(f"✅ Explicación guardada con hash: {hash_pregunta}")
+    return resultado
+
+@app.route('/generar-explicacion', methods=['POST'])
 def generar_explicacion():
     """Endpoint principal para generar explicaciones"""
-    # Manejar preflight OPTIONS request
-    if request.method == 'OPTIONS':
-        response = jsonify({'status': 'ok'})
-        response.headers.add('Access-Control-Allow-Origin', 'http://localhost:8095')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
-        response.headers.add('Access-Control-Allow-Methods', 'POST, OPTIONS')
-        return response
-        
     try:
         pregunta_data = request.get_json()
         
@@ -263,85 +777,123 @@ def generar_explicacion():
         
         logger.info(f"📝 Pregunta recibida: {pregunta_data.get('enunciado', '')[:50]}...")
         
+        # Usar el hash_pregunta que ya viene en los datos (generado en el proceso de duplicados)
+        hash_pregunta = resolver_hash_pregunta(pregunta_data)
+        
+        # Si ya hay explicación guardada para esta pregunta no se vuelve a llamar a GPT-5
+        # (salvo que el visor pida regenerarla explícitamente)
+        if not pregunta_data.get('regenerar'):
+            explicacion_guardada = load_explicaciones().get(hash_pregunta)
+            if explicacion_guardada:
+                logger.info(f"♻️ Explicación ya existente para hash {hash_pregunta}, sin llamar a GPT-5")
+                return jsonify(explicacion_guardada)
+        
         # Crear prompt y llamar a GPT-5
         prompt = create_prompt(pregunta_data)
         logger.info("📋 PROMPT ENVIADO A GPT-5:")
         logger.info("=" * 80)
         logger.info(prompt)
         logger.info("=" * 80)
-        gpt5_response = call_gpt5(prompt)
+        gpt5_response, resultado = generar_explicacion_gpt5(hash_pregunta, prompt)
         
         if not gpt5_response:
-            response = jsonify({'error': 'GPT-5 no está disponible. Verifica que la API key sea válida y esté activa.'})
-            response.headers.add('Access-Control-Allow-Origin', 'http://localhost:8095')
-            return response, 503
+            return jsonify({'error': 'GPT-5 no está disponible. Verifica que la API key sea válida y esté activa.'}), 503
         
-        # Parsear JSON de GPT-5
-        try:
-            explicacion_data = json.loads(gpt5_response)
-        except json.JSONDecodeError as e:
-            logger.error(f"❌ Error parseando JSON de GPT-5: {e}")
-            logger.error(f"📝 Respuesta recibida: {gpt5_response}")
+        if resultado is None:
             return jsonify({'error': 'Respuesta de GPT-5 no es JSON válido'}), 500
         
-        # Convertir al formato esperado por el visor (nuevo formato más simple)
-        resultado = {
-            'id': f"exp_{int(datetime.now().timestamp())}",
-            'resumen_pregunta': 'Explicación generada por GPT-5',
-            'opciones': [],  # Se llenará desde el markdown
-            'conclusion': explicacion_data.get('markdown', 'Explicación no disponible'),
-            'recursos_visuales': [],
-            'nivel_dificultad': 'Intermedio',
-            'fecha_creacion': datetime.now().isoformat(),
-            'llm_utilizado': 'openai-gpt-5-flask-api',
-            'image_prompt': explicacion_data.get('image_prompt', '')  # Campo para generador de imágenes
-        }
-        
-        # Añadir diagrama SVG si existe
-        if explicacion_data.get('diagram_svg') and explicacion_data['diagram_svg'] != 'null':
-            svg_content = explicacion_data['diagram_svg'].strip()
-            if svg_content and svg_content != 'null':
-                resultado['recursos_visuales'].append({
-                    'tipo': 'svg',
-                    'descripcion': 'Diagrama explicativo generado por IA',
-                    'svg_content': svg_content,
-                    'texto_alternativo': 'Diagrama que ilustra la respuesta correcta'
-                })
-                logger.info("✅ SVG diagrama añadido a recursos visuales")
-            else:
-                logger.info("ℹ️ SVG no generado (null o vacío)")
-        else:
-            logger.info("ℹ️ No se generó diagrama SVG")
-        
-        # Usar el hash_pregunta que ya viene en los datos (generado en el proceso de duplicados)
-        hash_pregunta = pregunta_data.get('hash_pregunta', '')
-        if not hash_pregunta:
-            # Fallback: generar hash si no viene en los datos
-            hash_pregunta = generate_hash_pregunta(pregunta_data)
-            logger.warning(f"⚠️ Hash no encontrado en datos, generado: {hash_pregunta}")
-        
-        resultado['hash_pregunta'] = hash_pregunta
+        logger.info("✅ Explicación generada y convertida exitosamente")
+        return jsonify(resultado)
         
-        # Cargar explicaciones existentes
-        explicaciones = load_explicaciones()
+    except Exception as e:
+        logger.error(f"❌ Error en endpoint: {e}")
+        return jsonify({'error': f'Error interno: {str(e)}'}), 500
+
+@app.route('/generar-explicacion-batch', methods=['POST'])
+def generar_explicacion_batch():
+    """Generar explicaciones para una lista de preguntas con llamadas concurrentes a GPT-5"""
+    try:
+        datos = request.get_json()
+        preguntas = datos.get('preguntas') if isinstance(datos, dict) else datos
         
-        # Guardar nueva explicación
-        explicaciones[hash_pregunta] = resultado
+        if not preguntas or not isinstance(preguntas, list):
+            return jsonify({'error': 'Se esperaba una lista de preguntas'}), 400
+        if len(preguntas) > MAX_LOTE:
+            return jsonify({'error': f'Demasiadas preguntas en el lote (máx. {MAX_LOTE})'}), 413
         
-        # Guardar en archivo JSON
-        save_explicaciones(explicaciones)
+        logger.info(f"📦 Lote recibido: {len(preguntas)} preguntas")
         
-        logger.info(f"✅ Explicación guardada con hash: {hash_pregunta}")
-        logger.info("✅ Explicación generada y convertida exitosamente")
-        response = jsonify(resultado)
-        response.headers.add('Access-Control-Allow-Origin', 'http://localhost:8095')
-        return response
+        # Las que ya tienen explicación guardada se devuelven sin llamar a GPT-5
+        explicaciones = load_explicaciones()
+        hashes = [resolver_hash_pregunta(pregunta) for pregunta in preguntas]
+        resultados = [None if pregunta.get('regenerar') else explicaciones.get(hash_pregunta)
+                      for pregunta, hash_pregunta in zip(preguntas, hashes)]
+        pendientes = [i for i, resultado in enumerate(resultados) if not resultado]
+        
+        if pendientes:
+            logger.info(f"🚀 Lanzando {len(pendientes)} llamadas a GPT-5 (máx. {GPT5_BATCH_CONCURRENCIA} simultáneas)")
+            respuestas = call_gpt5_batch([hashes[i] for i in pendientes],
+                                         [create_prompt(preguntas[i]) for i in pendientes])
+            for i, (gpt5_response, resultado) in zip(pendientes, respuestas):
+                if not gpt5_response:
+                    resultados[i] = {'hash_pregunta': hashes[i], 'error': 'GPT-5 no está disponible'}
+                    continue
+                resultados[i] = resultado or \
+                    {'hash_pregunta': hashes[i], 'error': 'Respuesta de GPT-5 no es JSON válido'}
+        
+        errores = sum(1 for resultado in resultados if 'error' in resultado)
+        logger.info(f"✅ Lote completado: {len(resultados) - errores} explicaciones, {errores} errores")
+        return jsonify({'resultados': resultados, 'llamadas_gpt5': len(pendientes), 'errores': errores})
         
     except Exception as e:
-        logger.error(f"❌ Error en endpoint: {e}")
-        response = jsonify({'error': f'Error interno: {str(e)}'})
-        response.headers.add('Access-Control-Allow-Origin', 'http://localhost:8095')
-        return response, 500
+        logger.error(f"❌ Error en lote: {e}")
+        return jsonify({'error': f'Error interno: {str(e)}'}), 500
+
+def _evento_sse(datos, evento=None):
+    """Serializar un evento Server-Sent Events"""
+    cabecera = f"event: {evento}\n".encode() if evento else b''
+    return cabecera + b'data: ' + orjson.dumps(datos) + b'\n\n'
+
+@app.route('/generar-explicacion-stream', methods=['POST'])
+def generar_explicacion_stream():
+    """Como /generar-explicacion, pero reenvía al navegador el texto de GPT-5 según llega (SSE)"""
+    pregunta_data = request.get_json()
+    
+    if not pregunta_data:
+        return jsonify({'error': 'No se recibió data de pregunta'}), 400
+    
+    hash_pregunta = resolver_hash_pregunta(pregunta_data)
+    
+    def generar_eventos():
+        if not pregunta_data.get('regenerar'):
+            explicacion_guardada = load_explicaciones().get(hash_pregunta)
+            if explicacion_guardada:
+                logger.info(f"♻️ Explicación ya existente para hash {hash_pregunta}, sin llamar a GPT-5")
+                yield _evento_sse(explicacion_guardada, 'resultado')
+                return
+        
+        # Los fragmentos llegan en el hilo del bucle de GPT-5; este hilo los va reenviando
+        # (si otra petición ya estaba generando esta pregunta solo llega el resultado final)
+        fragmentos = queue.Queue()
+        futuro = asyncio.run_coroutine_threadsafe(
+            call_gpt5_unico(hash_pregunta, create_prompt(pregunta_data), fragmentos.put), _get_gpt5_loop())
+        futuro.add_done_callback(lambda _: fragmentos.put(None))
+        
+        while (fragmento := fragmentos.get()) is not None:
+            yield _evento_sse({'delta': fragmento})
+        
+        gpt5_response, resultado = futuro.result()
+        if not gpt5_response:
+            yield _evento_sse({'error': 'GPT-5 no está disponible. Verifica que la API key sea válida y esté activa.'}, 'error')
+            return
+        
+        if resultado is None:
+            yield _evento_sse({'error': 'Respuesta de GPT-5 no es JSON válido'}, 'error')
+            return
+        yield _evento_sse(resultado, 'resultado')
+    
+    return Response(generar_eventos(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/explicaciones', methods=['GET'])
 def get_explicaciones():
@@ -349,37 +901,37 @@ def get_explicaciones():
     try:
         explicaciones_raw = load_explicaciones()
 
-        # Convertir formato nuevo a formato esperado por frontend (manteniendo campos visuales)
-        explicaciones_converted = {}
-        for exp_id, exp_data in explicaciones_raw.items():
-            # Crear explicación en formato markdown combinando resumen y conclusion
-            explicacion_markdown = ""
-            if exp_data.get('resumen_pregunta'):
-                explicacion_markdown += f"# {exp_data['resumen_pregunta']}\n\n"
-            if exp_data.get('conclusion'):
-                explicacion_markdown += exp_data['conclusion']
-
-            # Crear entrada convertida manteniendo TODOS los campos originales
-            converted_entry = {
-                # Campos para compatibilidad con frontend antiguo
-                'explicacion': explicacion_markdown,
-                'fecha': exp_data.get('fecha_creacion', ''),
-                'modelo': exp_data.get('llm_utilizado', 'GPT-5'),
-                'pregunta': exp_data.get('resumen_pregunta', ''),
-
-                # MANTENER TODOS los campos del formato nuevo para funcionalidad visual
-                **exp_data  # Esto incluye recursos_visuales, image_uploaded_url, etc.
-            }
-            explicaciones_converted[exp_id] = converted_entry
+        def generar_json():
+            """Emitir el objeto JSON entrada a entrada, en bloques de ~64KB"""
+            partes = [b'{']
+            tamano = 1
+            for i, (exp_id, exp_data) in enumerate(explicaciones_raw.items()):
+                # Copia superficial con TODOS los campos originales (recursos_visuales, image_uploaded_url, etc.);
+                # los campos de compatibilidad solo se añaden si la entrada no los trae ya
+                converted_entry = exp_data.copy()
+                if 'explicacion' not in converted_entry:
+                    # Explicación en formato markdown combinando resumen y conclusion
+                    resumen = exp_data.get('resumen_pregunta')
+                    conclusion = exp_data.get('conclusion') or ''
+                    converted_entry['explicacion'] = f"# {resumen}\n\n{conclusion}" if resumen else conclusion
+                converted_entry.setdefault('fecha', exp_data.get('fecha_creacion', ''))
+                converted_entry.setdefault('modelo', exp_data.get('llm_utilizado', 'GPT-5'))
+                converted_entry.setdefault('pregunta', exp_data.get('resumen_pregunta', ''))
+                parte = b'%s%s:%s' % (b',' if i else b'', orjson.dumps(exp_id), orjson.dumps(converted_entry, default=str))
+                partes.append(parte)
+                tamano += len(parte)
+                if tamano >= STREAM_CHUNK_SIZE:
+                    yield b''.join(partes)
+                    partes, tamano = [], 0
+            partes.append(b'}')
+            yield b''.join(partes)
 
-        response = jsonify(explicaciones_converted)
-        response.headers.add('Access-Control-Allow-Origin', 'http://localhost:8095')
-        return response
+        # Convertir formato nuevo a formato esperado por frontend sin materializar el dict completo
+        # (load_explicaciones devuelve una instantánea inmutable, se puede recorrer mientras se envía)
+        return Response(generar_json(), mimetype='application/json')
     except Exception as e:
         logger.error(f"Error obteniendo explicaciones: {e}")
-        response = jsonify({'error': str(e)})
-        response.headers.add('Access-Control-Allow-Origin', 'http://localhost:8095')
-        return response, 500
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/explicacion/<hash_pregunta>', methods=['GET'])
 def get_explicacion(hash_pregunta):
@@ -387,58 +939,34 @@ def get_explicacion(hash_pregunta):
     try:
         explicaciones = load_explicaciones()
         if hash_pregunta in explicaciones:
-            response = jsonify(explicaciones[hash_pregunta])
-            response.headers.add('Access-Control-Allow-Origin', 'http://localhost:8095')
-            return response
+            return jsonify(explicaciones[hash_pregunta])
         else:
-            response = jsonify({'error': 'Explicación no encontrada'})
-            response.headers.add('Access-Control-Allow-Origin', 'http://localhost:8095')
-            return response, 404
+            return jsonify({'error': 'Explicación no encontrada'}), 404
     except Exception as e:
         logger.error(f"Error obteniendo explicación {hash_pregunta}: {e}")
-        response = jsonify({'error': str(e)})
-        response.headers.add('Access-Control-Allow-Origin', 'http://localhost:8095')
-        return response, 500
+        return jsonify({'error': str(e)}), 500
 
-@app.route('/reemplazar-svg-con-imagen', methods=['POST', 'OPTIONS'])
+@app.route('/reemplazar-svg-con-imagen', methods=['POST'])
 def reemplazar_svg_con_imagen():
     """Reemplazar SVG con imagen PNG generada por GPT-5"""
-    # Manejar preflight OPTIONS request
-    if request.method == 'OPTIONS':
-        response = jsonify({'status': 'ok'})
-        response.headers.add('Access-Control-Allow-Origin', 'http://localhost:8095')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
-        response.headers.add('Access-Control-Allow-Methods', 'POST, OPTIONS')
-        response.headers.add('Access-Control-Allow-Credentials', 'true')
-        return response
-        
     try:
         data = request.get_json()
         hash_pregunta = data.get('hash_pregunta')
         
         if not hash_pregunta:
-            response = jsonify({'error': 'hash_pregunta es requerido'})
-            response.headers.add('Access-Control-Allow-Origin', 'http://localhost:8095')
-            response.headers.add('Access-Control-Allow-Credentials', 'true')
-            return response, 400
+            return jsonify({'error': 'hash_pregunta es requerido'}), 400
         
         # Cargar explicaciones
         explicaciones = load_explicaciones()
         
         if hash_pregunta not in explicaciones:
-            response = jsonify({'error': 'Explicación no encontrada'})
-            response.headers.add('Access-Control-Allow-Origin', 'http://localhost:8095')
-            response.headers.add('Access-Control-Allow-Credentials', 'true')
-            return response, 404
+            return jsonify({'error': 'Explicación no encontrada'}), 404
         
         explicacion = explicaciones[hash_pregunta]
         image_prompt = explicacion.get('image_prompt')
         
         if not image_prompt:
-            response = jsonify({'error': 'No hay prompt de imagen disponible'})
-            response.headers.add('Access-Control-Allow-Origin', 'http://localhost:8095')
-            response.headers.add('Access-Control-Allow-Credentials', 'true')
-            return response, 400
+            return jsonify({'error': 'No hay prompt de imagen disponible'}), 400
         
         logger.info(f"🎨 Generando imagen PNG para hash {hash_pregunta}")
         logger.info(f"📝 Prompt: {image_prompt[:100]}...")
@@ -449,153 +977,101 @@ def reemplazar_svg_con_imagen():
         # Guardar imagen PNG en servidor
         image_url = save_image_png_to_server(image_data, hash_pregunta)
         
-        # Actualizar explicación con nueva URL de imagen PNG
-        explicacion['image_png_url'] = image_url
-        explicacion['image_png_generated_at'] = datetime.now().isoformat()
-        
-        # Guardar explicaciones actualizadas
-        save_explicaciones(explicaciones)
+        # Actualizar explicación con nueva URL de imagen PNG y guardarla
+        actualizar_explicacion(hash_pregunta, {
+            'image_png_url': image_url,
+            'image_png_generated_at': datetime.now().isoformat()
+        })
         
         logger.info(f"✅ Imagen PNG generada y guardada: {image_url}")
         
-        response = jsonify({
+        return jsonify({
             'success': True,
             'image_png_url': image_url,
             'message': 'Imagen PNG generada correctamente'
         })
-        response.headers.add('Access-Control-Allow-Origin', 'http://localhost:8095')
-        response.headers.add('Access-Control-Allow-Credentials', 'true')
-        return response
         
     except Exception as e:
         logger.error(f"❌ Error generando imagen PNG: {e}")
-        response = jsonify({
+        return jsonify({
             'error': f'Error generando imagen PNG: {str(e)}'
-        })
-        response.headers.add('Access-Control-Allow-Origin', 'http://localhost:8095')
-        response.headers.add('Access-Control-Allow-Credentials', 'true')
-        return response, 500
+        }), 500
 
-@app.route('/subir-imagen', methods=['POST', 'OPTIONS'])
+@app.route('/subir-imagen', methods=['POST'])
 def subir_imagen():
     """Subir imagen para reemplazar SVG en explicación"""
-    # Manejar preflight OPTIONS request
-    if request.method == 'OPTIONS':
-        response = jsonify({'status': 'ok'})
-        response.headers.add('Access-Control-Allow-Origin', 'http://localhost:8095')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
-        response.headers.add('Access-Control-Allow-Methods', 'POST, OPTIONS')
-        response.headers.add('Access-Control-Allow-Credentials', 'true')
-        return response
-        
     try:
         # Obtener datos del formulario
         hash_pregunta = request.form.get('hash_pregunta')
         
         if not hash_pregunta:
-            response = jsonify({'error': 'hash_pregunta es requerido'})
-            response.headers.add('Access-Control-Allow-Origin', 'http://localhost:8095')
-            response.headers.add('Access-Control-Allow-Credentials', 'true')
-            return response, 400
+            return jsonify({'error': 'hash_pregunta es requerido'}), 400
+        
+        if request.content_length and request.content_length > MAX_IMAGEN_BYTES:
+            return jsonify({'error': 'Imagen demasiado grande (máx. 10 MB)'}), 413
         
         # Verificar que hay archivo
         if 'imagen' not in request.files:
-            response = jsonify({'error': 'No se encontró archivo de imagen'})
-            response.headers.add('Access-Control-Allow-Origin', 'http://localhost:8095')
-            response.headers.add('Access-Control-Allow-Credentials', 'true')
-            return response, 400
+            return jsonify({'error': 'No se encontró archivo de imagen'}), 400
         
         file = request.files['imagen']
         
         if file.filename == '':
-            response = jsonify({'error': 'No se seleccionó archivo'})
-            response.headers.add('Access-Control-Allow-Origin', 'http://localhost:8095')
-            response.headers.add('Access-Control-Allow-Credentials', 'true')
-            return response, 400
+            return jsonify({'error': 'No se seleccionó archivo'}), 400
         
         # Verificar que la explicación existe
         explicaciones = load_explicaciones()
         if hash_pregunta not in explicaciones:
-            response = jsonify({'error': 'Explicación no encontrada'})
-            response.headers.add('Access-Control-Allow-Origin', 'http://localhost:8095')
-            response.headers.add('Access-Control-Allow-Credentials', 'true')
-            return response, 404
+            return jsonify({'error': 'Explicación no encontrada'}), 404
         
         # Validar tipo de archivo
-        allowed_extensions = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-        if '.' not in file.filename or file.filename.rsplit('.', 1)[1].lower() not in allowed_extensions:
-            response = jsonify({'error': 'Tipo de archivo no permitido. Use: PNG, JPG, JPEG, GIF, WEBP'})
-            response.headers.add('Access-Control-Allow-Origin', 'http://localhost:8095')
-            response.headers.add('Access-Control-Allow-Credentials', 'true')
-            return response, 400
+        nombre_original = secure_filename(file.filename)
+        file_extension = os.path.splitext(nombre_original)[1].lower().lstrip('.')
+        if file_extension not in EXTENSIONES_IMAGEN:
+            return jsonify({'error': 'Tipo de archivo no permitido. Use: PNG, JPG, JPEG, GIF, WEBP'}), 400
         
         # Crear directorio si no existe
         os.makedirs(IMAGES_DIR, exist_ok=True)
         
         # Generar nombre de archivo único
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        file_extension = file.filename.rsplit('.', 1)[1].lower()
+        timestamp = marca_tiempo()
         filename = f"{hash_pregunta}_{timestamp}.{file_extension}"
         filepath = os.path.join(IMAGES_DIR, filename)
         
-        # Guardar archivo
-        file.save(filepath)
+        # Guardar archivo copiando el stream por bloques (werkzeug ya vuelca a disco los ficheros grandes)
+        file.save(filepath, buffer_size=UPLOAD_BUFFER)
         
-        # Actualizar explicación con nueva URL de imagen
-        explicacion = explicaciones[hash_pregunta]
-        explicacion['image_uploaded_url'] = f"images/{filename}"
-        explicacion['image_uploaded_at'] = datetime.now().isoformat()
-        explicacion['image_uploaded_filename'] = file.filename
-        
-        # Guardar explicaciones actualizadas
-        save_explicaciones(explicaciones)
+        # Actualizar explicación con nueva URL de imagen y guardarla
+        actualizar_explicacion(hash_pregunta, {
+            'image_uploaded_url': f"images/{filename}",
+            'image_uploaded_at': datetime.now().isoformat(),
+            'image_uploaded_filename': nombre_original
+        })
         
         logger.info(f"✅ Imagen subida correctamente: {filename}")
         
-        response = jsonify({
+        return jsonify({
             'success': True,
             'image_url': f"images/{filename}",
             'message': 'Imagen subida correctamente'
         })
-        response.headers.add('Access-Control-Allow-Origin', 'http://localhost:8095')
-        response.headers.add('Access-Control-Allow-Credentials', 'true')
-        return response
         
     except Exception as e:
         logger.error(f"❌ Error subiendo imagen: {e}")
-        response = jsonify({
+        return jsonify({
             'error': f'Error subiendo imagen: {str(e)}'
-        })
-        response.headers.add('Access-Control-Allow-Origin', 'http://localhost:8095')
-        response.headers.add('Access-Control-Allow-Credentials', 'true')
-        return response, 500
+        }), 500
 
 @app.route('/images/<filename>')
 def serve_image(filename):
-    """Servir imágenes estáticas"""
+    """Servir imágenes estáticas (con ETag/Last-Modified para que el navegador reciba 304)"""
     try:
-        filepath = os.path.join(IMAGES_DIR, filename)
-        if os.path.exists(filepath):
-            # Determinar tipo MIME basado en extensión
-            if filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.webp')):
-                mimetype = 'image/png' if filename.lower().endswith('.png') else 'image/jpeg'
-            else:
-                mimetype = 'image/png'  # fallback
-            
-            response = send_file(filepath, mimetype=mimetype)
-            response.headers.add('Access-Control-Allow-Origin', 'http://localhost:8095')
-            response.headers.add('Access-Control-Allow-Credentials', 'true')
-            return response
-        else:
-            response = jsonify({'error': 'Imagen no encontrada'})
-            response.headers.add('Access-Control-Allow-Origin', 'http://localhost:8095')
-            response.headers.add('Access-Control-Allow-Credentials', 'true')
-            return response, 404
+        # abspath: send_from_directory resuelve las rutas relativas contra la carpeta de la app
+        return send_from_directory(os.path.abspath(IMAGES_DIR), filename, conditional=True, max_age=86400)
+    except NotFound:
+        return jsonify({'error': 'Imagen no encontrada'}), 404
     except Exception as e:
-        response = jsonify({'error': f'Error sirviendo imagen: {str(e)}'})
-        response.headers.add('Access-Control-Allow-Origin', 'http://localhost:8095')
-        response.headers.add('Access-Control-Allow-Credentials', 'true')
-        return response, 500
+        return jsonify({'error': f'Error sirviendo imagen: {str(e)}'}), 500
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -610,22 +1086,10 @@ def guardar_datos():
         if not data:
             return jsonify({'error': 'No se recibieron datos'}), 400
         
-        # Ruta al archivo de datos principal
-        datos_json_path = '../../data/json/data_unificado_con_duplicados.json'
-        
-        # Crear backup antes de modificar
-        backup_path = f"{datos_json_path}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        if os.path.exists(datos_json_path):
-            import shutil
-            shutil.copy2(datos_json_path, backup_path)
-            logger.info(f"📋 Backup creado: {backup_path}")
+        # Guardar los datos actualizados (con backup rotativo)
+        escribir_json_atomico(DATOS_JSON_PATH, data)
         
-        # Guardar los datos actualizados
-        os.makedirs(os.path.dirname(datos_json_path), exist_ok=True)
-        with open(datos_json_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        
-        logger.info(f"✅ Datos guardados exitosamente en {datos_json_path}")
+        logger.info(f"✅ Datos guardados exitosamente en {DATOS_JSON_PATH}")
         return jsonify({'success': True, 'message': 'Datos guardados correctamente'})
         
     except Exception as e:
@@ -640,13 +1104,6 @@ def guardar_explicaciones():
         if not explicaciones:
             return jsonify({'error': 'No se recibieron explicaciones'}), 400
         
-        # Crear backup antes de modificar
-        backup_path = f"{EXPLICACIONES_JSON_PATH}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        if os.path.exists(EXPLICACIONES_JSON_PATH):
-            import shutil
-            shutil.copy2(EXPLICACIONES_JSON_PATH, backup_path)
-            logger.info(f"📋 Backup explicaciones creado: {backup_path}")
-        
         # Guardar las explicaciones actualizadas
         save_explicaciones(explicaciones)
         
@@ -667,20 +1124,8 @@ def borrar_explicacion():
         
         hash_explicacion = data['hash']
         
-        # Cargar explicaciones actuales
-        explicaciones = load_explicaciones()
-        
-        # Crear backup antes de modificar
-        backup_path = f"{EXPLICACIONES_JSON_PATH}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        if os.path.exists(EXPLICACIONES_JSON_PATH):
-            import shutil
-            shutil.copy2(EXPLICACIONES_JSON_PATH, backup_path)
-            logger.info(f"📋 Backup explicaciones creado: {backup_path}")
-        
         # Borrar la explicación
-        if hash_explicacion in explicaciones:
-            del explicaciones[hash_explicacion]
-            save_explicaciones(explicaciones)
+        if borrar_explicacion_guardada(hash_explicacion):
             logger.info(f"✅ Explicación {hash_explicacion} borrada exitosamente")
             return jsonify({'success': True, 'message': 'Explicación borrada correctamente'})
         else:
@@ -695,15 +1140,12 @@ def borrar_explicacion():
 def limpiar_explicaciones():
     """Limpiar todas las explicaciones"""
     try:
-        # Crear backup antes de modificar
-        backup_path = f"{EXPLICACIONES_JSON_PATH}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        if os.path.exists(EXPLICACIONES_JSON_PATH):
-            import shutil
-            shutil.copy2(EXPLICACIONES_JSON_PATH, backup_path)
-            logger.info(f"📋 Backup explicaciones creado: {backup_path}")
+        if not load_explicaciones():
+            logger.info("ℹ️ No había explicaciones que limpiar")
+            return jsonify({'success': True, 'message': 'Todas las explicaciones han sido limpiadas'})
         
-        # Limpiar todas las explicaciones
-        save_explicaciones({})
+        # Limpiar todas las explicaciones (siempre con backup previo)
+        save_explicaciones({}, forzar_backup=True)
         
         logger.info(f"✅ Todas las explicaciones han sido limpiadas")
         return jsonify({'success': True, 'message': 'Todas las explicaciones han sido limpiadas'})
@@ -712,66 +1154,214 @@ def limpiar_explicaciones():
         logger.error(f"❌ Error limpiando explicaciones: {e}")
         return jsonify({'error': f'Error limpiando explicaciones: {str(e)}'}), 500
 
+# Pool de conexiones a PostgreSQL, creado la primera vez que se usa. ThreadedConnectionPool
+# lanza PoolError si se agota, así que el semáforo hace esperar a los hilos que sobren
+_pg_pool = None
+_pg_pool_lock = threading.Lock()
+_pg_pool_huecos = threading.BoundedSemaphore(PG_POOL_MAX)
+# Circuit breaker: fallos de conexión/consulta seguidos y hasta cuándo no se intenta conectar
+_pg_fallos_seguidos = 0
+_pg_circuito_hasta = 0.0
+
+class ConexionPG(psycopg2.extensions.connection):
+    """Conexión que recuerda qué sentencias preparadas (PREPARE) tiene ya en el servidor"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.preparadas = set()
+
+def _get_pg_pool():
+    """Crear (una sola vez por proceso) el pool de conexiones a PostgreSQL"""
+    global _pg_pool
+    with _pg_pool_lock:
+        if _pg_pool is None:
+            limites = {
+                'connect_timeout': PG_CONNECT_TIMEOUT,
+                'options': f"-c statement_timeout={PG_STATEMENT_TIMEOUT_MS}",
+            }
+            if DATABASE_URL:
+                _pg_pool = psycopg2.pool.ThreadedConnectionPool(
+                    PG_POOL_MIN, PG_POOL_MAX, DATABASE_URL, connection_factory=ConexionPG, **limites)
+            else:
+                _pg_pool = psycopg2.pool.ThreadedConnectionPool(
+                    PG_POOL_MIN, PG_POOL_MAX, connection_factory=ConexionPG, **DB_CONFIG, **limites)
+            logger.info(f"🐘 Pool PostgreSQL creado ({PG_POOL_MIN}-{PG_POOL_MAX} conexiones)")
+    return _pg_pool
+
+def _registrar_fallo_pg():
+    """Contar un fallo de PostgreSQL y abrir el circuito si se repiten"""
+    global _pg_fallos_seguidos, _pg_circuito_hasta
+    _pg_fallos_seguidos += 1
+    if _pg_fallos_seguidos >= PG_CIRCUITO_FALLOS:
+        _pg_circuito_hasta = time.monotonic() + PG_CIRCUITO_PAUSA
+        logger.warning(f"⚡ PostgreSQL falla {_pg_fallos_seguidos} veces seguidas: pausa de {PG_CIRCUITO_PAUSA}s")
+
+@contextmanager
+def conexion_pg():
+    """Tomar una conexión del pool (autocommit) y devolverla al terminar; las rotas se descartan"""
+    global _pg_fallos_seguidos
+    # Con el circuito abierto se falla al momento en vez de esperar al connect_timeout
+    if time.monotonic() < _pg_circuito_hasta:
+        raise psycopg2.OperationalError("PostgreSQL no disponible (circuito abierto)")
+    if not _pg_pool_huecos.acquire(timeout=PG_ESPERA_POOL):
+        raise psycopg2.pool.PoolError("Pool PostgreSQL agotado")
+    try:
+        try:
+            pool = _get_pg_pool()
+            conn = pool.getconn()
+        except psycopg2.OperationalError:
+            _registrar_fallo_pg()
+            raise
+        rota = False
+        try:
+            conn.autocommit = True
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # Incluye QueryCanceledError (statement_timeout)
+            rota = True
+            _registrar_fallo_pg()
+            raise
+        else:
+            _pg_fallos_seguidos = 0
+        finally:
+            pool.putconn(conn, close=rota or bool(conn.closed))
+    finally:
+        _pg_pool_huecos.release()
+
+def ejecutar_preparada(cur, nombre, sql, params=()):
+    """Ejecutar ``sql`` como sentencia preparada ``nombre``: se prepara una vez por conexión"""
+    conn = cur.connection
+    ejecutar = f"EXECUTE {nombre} ({', '.join(['%s'] * len(params))})" if params else f"EXECUTE {nombre}"
+    if nombre in conn.preparadas:
+        cur.execute(ejecutar, params or None)
+        return
+    
+    # Primera vez en esta conexión: PREPARE y EXECUTE viajan juntos en un solo round trip
+    # (con parámetros psycopg2 interpola la cadena entera, de ahí el escape de los %)
+    preparar = f"PREPARE {nombre} AS {sql.replace('%', '%%') if params else sql};\n"
+    try:
+        cur.execute(preparar + ejecutar, params or None)
+    except psycopg2.Error:
+        # Si lo que falló fue el EXECUTE, el PREPARE ya quedó registrado en la sesión
+        try:
+            cur.execute("SELECT 1 FROM pg_prepared_statements WHERE name = %s", (nombre,))
+            if cur.fetchone():
+                conn.preparadas.add(nombre)
+        except psycopg2.Error:
+            pass
+        raise
+    conn.preparadas.add(nombre)
+
+# Exámenes con su número de preguntas; los casts a texto mantienen el formato que devolvía psql
+# (fecha ISO y cadenas vacías en vez de NULL). El número de preguntas sale del contador
+# exams.num_preguntas que mantienen los triggers de sql/exams_num_preguntas.sql
+EXAMENES_QUERY = """
+SELECT
+    e.id::text,
+    e.titulo,
+    COALESCE(e.fecha::text, ''),
+    COALESCE(e.convocatoria, ''),
+    COALESCE(e.tipo_examen, ''),
+    e.num_preguntas
+FROM exams e
+ORDER BY e.convocatoria DESC, e.tipo_examen, e.titulo
+"""
+
+# Misma consulta contando las preguntas, para bases de datos sin la migración aplicada.
+# Una subconsulta por examen recorre solo el índice (exam_id, numero_pregunta) de ese examen
+# (index-only scan) en vez de unir y agrupar toda la tabla questions
+EXAMENES_QUERY_AGREGADA = """
+SELECT
+    e.id::text,
+    e.titulo,
+    COALESCE(e.fecha::text, ''),
+    COALESCE(e.convocatoria, ''),
+    COALESCE(e.tipo_examen, ''),
+    (SELECT COUNT(*) FROM questions q WHERE q.exam_id = e.id) as num_preguntas
+FROM exams e
+ORDER BY e.convocatoria DESC, e.tipo_examen, e.titulo
+"""
+
+# Última respuesta de /api/examenes ya serializada: (instante monotonic, JSON, ETag, JSON gzip)
+_examenes_cache = None
+# Pasa a False si la base de datos no tiene la columna exams.num_preguntas
+_examenes_con_contador = True
+
+def _consultar_examenes():
+    """Consultar los exámenes con su número de preguntas"""
+    global _examenes_con_contador
+    with conexion_pg() as conn, conn.cursor() as cur:
+        if _examenes_con_contador:
+            try:
+                ejecutar_preparada(cur, 'examenes_list', EXAMENES_QUERY)
+            except psycopg2.errors.UndefinedColumn:
+                logger.warning("⚠️ Falta exams.num_preguntas (aplica sql/exams_num_preguntas.sql), se cuentan las preguntas en cada consulta")
+                _examenes_con_contador = False
+        if not _examenes_con_contador:
+            ejecutar_preparada(cur, 'examenes_list_agregada', EXAMENES_QUERY_AGREGADA)
+
+        # Las filas llegan ya tipadas (num_preguntas es int); se recorren directamente del cursor
+        examenes = [{
+            'id': exam_id,
+            'titulo': titulo,
+            'fecha': fecha,
+            'convocatoria': convocatoria,
+            'tipo_examen': tipo_examen,
+            'num_preguntas': num_preguntas
+        } for exam_id, titulo, fecha, convocatoria, tipo_examen, num_preguntas in cur]
+
+    logger.info(f"✅ Obtenidos {len(examenes)} exámenes desde PostgreSQL")
+    return examenes
+
 @app.route('/api/examenes', methods=['GET'])
 def get_examenes_postgresql():
     """Obtener exámenes desde PostgreSQL para los filtros del frontend"""
+    global _examenes_cache
     try:
-        import subprocess
-
-        # Ejecutar consulta para obtener exámenes con preguntas
-        query = """
-        SELECT
-            e.id,
-            e.titulo,
-            e.fecha,
-            e.convocatoria,
-            e.tipo_examen,
-            COUNT(q.id) as num_preguntas
-        FROM exams e
-        LEFT JOIN questions q ON e.id = q.exam_id
-        GROUP BY e.id, e.titulo, e.fecha, e.convocatoria, e.tipo_examen
-        ORDER BY e.convocatoria DESC, e.tipo_examen, e.titulo;
-        """
-
-        cmd = [
-            "docker", "exec", "per_postgres",
-            "psql", "-U", "per_user", "-d", "per_exams",
-            "-t", "-c", query
-        ]
-
-        result = subprocess.run(cmd, capture_output=True, text=True)
-
-        if result.returncode != 0:
-            logger.error(f"Error ejecutando consulta PostgreSQL: {result.stderr}")
-            return jsonify({'error': 'Error accediendo a PostgreSQL'}), 500
-
-        # Parsear resultados
-        examenes = []
-        for line in result.stdout.strip().split('\n'):
-            if line.strip():
-                parts = [p.strip() for p in line.split('|')]
-                if len(parts) >= 6:
-                    examenes.append({
-                        'id': parts[0],
-                        'titulo': parts[1],
-                        'fecha': parts[2],
-                        'convocatoria': parts[3],
-                        'tipo_examen': parts[4],
-                        'num_preguntas': int(parts[5]) if parts[5].isdigit() else 0
-                    })
-
-        logger.info(f"✅ Obtenidos {len(examenes)} exámenes desde PostgreSQL")
-        return jsonify({
-            'examenes': examenes,
-            'total': len(examenes),
-            'timestamp': datetime.now().isoformat()
-        })
+        cache = _examenes_cache
+        if cache is None or time.monotonic() - cache[0] >= EXAMENES_CACHE_TTL:
+            examenes = _consultar_examenes()
+            # El ETag depende solo de los exámenes (no del timestamp): si no han cambiado se
+            # mantiene la respuesta anterior y los navegadores siguen recibiendo 304
+            etag = hashlib.blake2b(orjson.dumps(examenes), digest_size=8).hexdigest()
+            if cache is not None and cache[2] == etag:
+                payload, payload_gzip = cache[1], cache[3]
+            else:
+                payload = orjson.dumps({
+                    'examenes': examenes,
+                    'total': len(examenes),
+                    'timestamp': datetime.now().isoformat()
+                })
+                # Se comprime una vez por refresco, no por petición (claves repetidas: ~10x menos bytes)
+                payload_gzip = gzip.compress(payload, compresslevel=6)
+            cache = _examenes_cache = (time.monotonic(), payload, etag, payload_gzip)
+
+        # Con If-None-Match igual al ETag, make_conditional responde 304 sin cuerpo
+        if request.accept_encodings['gzip']:
+            response = Response(cache[3], mimetype='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+            response.set_etag(f"{cache[2]}-gzip")
+        else:
+            response = Response(cache[1], mimetype='application/json')
+            response.set_etag(cache[2])
+        response.vary.add('Accept-Encoding')
+        return response.make_conditional(request)
 
+    except (psycopg2.OperationalError, psycopg2.pool.PoolError) as e:
+        # Caída, timeout o pool agotado: 503 para que el cliente reintente más tarde
+        logger.error(f"❌ PostgreSQL no disponible: {e}")
+        response = jsonify({'error': 'PostgreSQL no disponible'})
+        response.headers['Retry-After'] = str(PG_CIRCUITO_PAUSA)
+        return response, 503
+    except psycopg2.Error as e:
+        logger.error(f"Error ejecutando consulta PostgreSQL: {e}")
+        return jsonify({'error': 'Error accediendo a PostgreSQL'}), 500
     except Exception as e:
         logger.error(f"❌ Error obteniendo exámenes: {e}")
         return jsonify({'error': f'Error obteniendo exámenes: {str(e)}'}), 500
 
 if __name__ == '__main__':
+    # Servidor de desarrollo de Werkzeug; en producción: gunicorn -c gunicorn_conf.py api_explicaciones:app
     logger.info("🚀 API de Explicaciones iniciando en puerto 5001")
     logger.info("🌐 URL: http://localhost:5001")
     logger.info("🔗 Endpoints: POST /generar-explicacion, POST /guardar-datos")
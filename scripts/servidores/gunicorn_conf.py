@@ -0,0 +1,30 @@
+"""
+Configuración de Gunicorn para la API de explicaciones (puerto 5001)
+Uso: cd scripts/servidores && gunicorn -c gunicorn_conf.py api_explicaciones:app
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('API_EXPLICACIONES_PORT', '5001')}"
+
+# Un solo proceso: las explicaciones viven en memoria y las persiste un único hilo escritor,
+# varios procesos escribiendo el mismo JSON se pisarían los cambios. La concurrencia la dan
+# los hilos (las llamadas a GPT-5 solo esperan E/S en el bucle asyncio compartido).
+workers = 1
+worker_class = 'gthread'
+threads = int(os.getenv('API_EXPLICACIONES_THREADS', '32'))
+
+# call_gpt5 puede tardar hasta 300 s por intento: el timeout del worker tiene que ser mayor
+timeout = 360
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+loglevel = 'info'
+
+
+def post_worker_init(worker):
+    """Cargar las explicaciones al arrancar el worker para que no las pague la primera petición"""
+    from api_explicaciones import load_explicaciones
+    worker.log.info(f"📚 {len(load_explicaciones())} explicaciones cargadas en memoria")
@@ -0,0 +1,28 @@
+"""
+Configuración de Gunicorn para la API PostgreSQL (puerto 5001)
+Uso: cd scripts/servidores && gunicorn -c gunicorn_postgresql_conf.py api_postgresql:app
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+
+# Workers gevent: cada petición es un greenlet, así que las esperas a PostgreSQL, Redis y GPT-5
+# no bloquean el proceso. GEVENT=1 activa en api_postgresql el parcheo de psycopg2 (psycogreen)
+workers = int(os.getenv('WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gevent'
+worker_connections = int(os.getenv('WORKER_CONNECTIONS', '500'))
+raw_env = ['GEVENT=1']
+
+# Cada worker tiene su propio pool de DATABASE_MAX_CONNECTIONS conexiones: PostgreSQL debe admitir
+# workers × DATABASE_MAX_CONNECTIONS. Los greenlets que no cogen conexión esperan en el pool
+
+# call_gpt5 puede tardar hasta 300 s por intento: el timeout del worker tiene que ser mayor
+timeout = 360
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+loglevel = 'info'
@@ -0,0 +1,78 @@
+-- ====================================
+-- Contador de preguntas por examen (exams.num_preguntas) e índice de ordenación de /api/examenes
+-- ====================================
+-- /api/examenes lee este contador en vez de agrupar toda la tabla questions en cada petición.
+-- Lo mantienen triggers por sentencia con tablas de transición: una carga masiva de preguntas
+-- hace un único UPDATE agrupado por examen, no uno por fila.
+-- Idempotente: se puede volver a aplicar sin problemas.
+--   psql -U per_user -d per_exams -f sql/exams_num_preguntas.sql
+
+ALTER TABLE exams ADD COLUMN IF NOT EXISTS num_preguntas INTEGER NOT NULL DEFAULT 0;
+
+-- Inicializar (o recalcular) el contador con los datos actuales
+UPDATE exams e
+SET num_preguntas = (SELECT COUNT(*) FROM questions q WHERE q.exam_id = e.id);
+
+CREATE OR REPLACE FUNCTION exams_num_preguntas_insert()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE exams e SET num_preguntas = e.num_preguntas + c.n
+    FROM (SELECT exam_id, COUNT(*) AS n FROM nuevas GROUP BY exam_id) c
+    WHERE e.id = c.exam_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION exams_num_preguntas_delete()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE exams e SET num_preguntas = e.num_preguntas - c.n
+    FROM (SELECT exam_id, COUNT(*) AS n FROM antiguas GROUP BY exam_id) c
+    WHERE e.id = c.exam_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Solo importa si una pregunta cambia de examen
+CREATE OR REPLACE FUNCTION exams_num_preguntas_update()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE exams e SET num_preguntas = e.num_preguntas + c.n
+    FROM (
+        SELECT exam_id, SUM(n) AS n FROM (
+            SELECT exam_id, 1 AS n FROM nuevas
+            UNION ALL
+            SELECT exam_id, -1 AS n FROM antiguas
+        ) cambios
+        GROUP BY exam_id
+        HAVING SUM(n) <> 0
+    ) c
+    WHERE e.id = c.exam_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_exams_num_preguntas_insert ON questions;
+CREATE TRIGGER trigger_exams_num_preguntas_insert
+    AFTER INSERT ON questions
+    REFERENCING NEW TABLE AS nuevas
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION exams_num_preguntas_insert();
+
+DROP TRIGGER IF EXISTS trigger_exams_num_preguntas_delete ON questions;
+CREATE TRIGGER trigger_exams_num_preguntas_delete
+    AFTER DELETE ON questions
+    REFERENCING OLD TABLE AS antiguas
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION exams_num_preguntas_delete();
+
+DROP TRIGGER IF EXISTS trigger_exams_num_preguntas_update ON questions;
+CREATE TRIGGER trigger_exams_num_preguntas_update
+    AFTER UPDATE ON questions
+    REFERENCING OLD TABLE AS antiguas NEW TABLE AS nuevas
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION exams_num_preguntas_update();
+
+-- Índice con el mismo orden que /api/examenes (ORDER BY convocatoria DESC, tipo_examen, titulo):
+-- el planificador puede devolver las filas ya ordenadas sin un nodo Sort
+CREATE INDEX IF NOT EXISTS exams_filter_idx ON exams (convocatoria DESC, tipo_examen, titulo);
@@ -0,0 +1,10 @@
+-- ====================================
+-- Columna questions.anulada (preguntas anuladas en la convocatoria oficial)
+-- ====================================
+-- La leen /preguntas-filtradas, /preguntas/<id> y la generación de exámenes, y la edita
+-- PUT /preguntas/<id>. ALTER TABLE bloquea toda la tabla questions: se aplica aquí una vez,
+-- nunca desde una petición.
+-- Idempotente: se puede volver a aplicar sin problemas.
+--   psql -U per_user -d per_exams -f sql/questions_anulada.sql
+
+ALTER TABLE questions ADD COLUMN IF NOT EXISTS anulada BOOLEAN DEFAULT FALSE;
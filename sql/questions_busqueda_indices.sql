@@ -0,0 +1,20 @@
+-- ====================================
+-- Índices de los filtros de /preguntas-filtradas (búsqueda de texto y tema)
+-- ====================================
+-- La búsqueda usa texto_pregunta ILIKE '%texto%': con el comodín inicial un btree no sirve y
+-- cada petición recorría toda la tabla questions. El índice GIN de trigramas (pg_trgm) permite
+-- resolver el ILIKE con un Bitmap Index Scan.
+-- El filtro por tema es categoria = x OR subcategoria = x: con un índice por columna el
+-- planificador combina ambos con un BitmapOr (un índice compuesto no cubre la rama de subcategoria).
+-- El filtro por convocatoria ya lo cubre exams_filter_idx (sql/exams_num_preguntas.sql).
+-- Idempotente: se puede volver a aplicar sin problemas.
+--   psql -U per_user -d per_exams -f sql/questions_busqueda_indices.sql
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS ix_questions_texto_trgm ON questions USING gin (texto_pregunta gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS ix_questions_categoria ON questions (categoria);
+CREATE INDEX IF NOT EXISTS ix_questions_subcategoria ON questions (subcategoria);
+
+ANALYZE questions;
@@ -1754,9 +1754,9 @@ class ExamViewer {
         // Primero eliminar la explicación existente
         this.deleteExplanation(hashPregunta);
         
-        // Luego generar una nueva
+        // Luego generar una nueva (el servidor no debe devolver la guardada)
         setTimeout(() => {
-            this.generateExplanation(hashPregunta);
+            this.generateExplanation(hashPregunta, true);
         }, 500);
     }
     
@@ -2527,7 +2527,7 @@ class ExamViewer {
         return null;
     }
     
-    async generateExplanation(hashPregunta) {
+    async generateExplanation(hashPregunta, regenerar = false) {
         try {
             // Encontrar la pregunta
             const pregunta = this.findQuestionByHash(hashPregunta);
@@ -2540,7 +2540,7 @@ class ExamViewer {
             this.updateExplanationButton(hashPregunta, 'loading');
             
             // Generar explicación usando Flask
-            const explicacion = await this.callOpenAI(pregunta);
+            const explicacion = await this.callOpenAI(pregunta, regenerar);
             
             if (explicacion) {
                 console.log('🎯 Explicación generada exitosamente para:', hashPregunta);
@@ -2573,19 +2573,19 @@ class ExamViewer {
         }
     }
     
-    async callOpenAI(pregunta) {
+    async callOpenAI(pregunta, regenerar = false) {
         console.log('📝 Enviando pregunta al API Flask en backend');
         
         try {
-            // Llamar al API Flask en puerto 5000
+            // Llamar al API Flask en puerto 5001 (en streaming: el texto se muestra según lo escribe GPT-5)
             console.log('🚀 Llamando al API Flask (puerto 5001) para GPT-5');
             
-            const response = await fetch('http://localhost:5001/generar-explicacion', {
+            const response = await fetch('http://localhost:5001/generar-explicacion-stream', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
                 },
-                body: JSON.stringify(pregunta)
+                body: JSON.stringify(regenerar ? { ...pregunta, regenerar: true } : pregunta)
             });
             
             if (!response.ok) {
@@ -2594,7 +2594,7 @@ class ExamViewer {
                 throw new Error(errorData.error || 'Error del API Flask');
             }
             
-            const explicacion = await response.json();
+            const explicacion = await this.readExplanationStream(response, this.getExplanationHash(pregunta));
             console.log('✅ Explicación recibida del API Flask:', explicacion);
             
             return explicacion;
@@ -2605,6 +2605,69 @@ class ExamViewer {
         }
     }
     
+    async readExplanationStream(response, hashPregunta) {
+        // Eventos SSE de /generar-explicacion-stream: {delta} mientras GPT-5 escribe y al final 'resultado' o 'error'
+        const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = '';
+        let texto = '';
+        try {
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += value;
+                let fin;
+                while ((fin = buffer.indexOf('\n\n')) !== -1) {
+                    const bloque = buffer.slice(0, fin);
+                    buffer = buffer.slice(fin + 2);
+                    let evento = 'message';
+                    let datos = '';
+                    for (const linea of bloque.split('\n')) {
+                        if (linea.startsWith('event:')) evento = linea.slice(6).trim();
+                        else if (linea.startsWith('data:')) datos += linea.slice(5);
+                    }
+                    if (!datos) continue;
+                    const payload = JSON.parse(datos);
+                    if (evento === 'resultado') return payload;
+                    if (evento === 'error') throw new Error(payload.error || 'Error del API Flask');
+                    texto += payload.delta;
+                    this.showExplanationProgress(hashPregunta, texto);
+                }
+            }
+        } finally {
+            this.showExplanationProgress(hashPregunta, null);
+        }
+        throw new Error('La conexión con el API Flask se cerró antes de recibir la explicación');
+    }
+    
+    showExplanationProgress(hashPregunta, texto) {
+        // Vista previa bajo la cabecera de la pregunta; texto null la retira
+        const buttons = document.querySelectorAll(`.btn-explanation[onclick*="'${hashPregunta}'"]`);
+        
+        buttons.forEach(button => {
+            const header = button.closest('.question-header');
+            if (!header) return;
+            let preview = header.nextElementSibling;
+            if (!preview || !preview.classList.contains('explanation-stream-preview')) {
+                if (texto === null) return;
+                preview = document.createElement('div');
+                preview.className = 'explanation-stream-preview';
+                header.insertAdjacentElement('afterend', preview);
+            }
+            if (texto === null) {
+                preview.remove();
+                return;
+            }
+            // GPT-5 escribe un JSON: se muestra el campo markdown según llega, sin esperar a que se cierre
+            const clave = texto.indexOf('"markdown"');
+            const inicio = clave === -1 ? -1 : texto.indexOf('"', clave + 10);
+            let markdown = inicio === -1 ? '' : texto.slice(inicio + 1);
+            const cierre = markdown.search(/(?<!\\)"/);
+            if (cierre !== -1) markdown = markdown.slice(0, cierre);
+            preview.textContent = markdown.replace(/\\n/g, '\n').replace(/\\"/g, '"') || '⏳ GPT-5 está escribiendo...';
+            preview.scrollTop = preview.scrollHeight;
+        });
+    }
+    
     convertOpenAIResponse(explicacionData, pregunta) {
         // Convertir respuesta de OpenAI al formato del visor
         const opciones = [];
@@ -0,0 +1,72 @@
+"""
+Unit tests for the SQL validator of the MCP PostgreSQL server.
+Pins the read-only rules of custom_query / custom_query_bulk so a sqlglot upgrade
+cannot silently let writes through.
+"""
+
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+# mcp-postgres.py is a script (hyphenated name), so it is loaded from its path
+_MCP_PATH = Path(__file__).resolve().parents[2] / "mcp-postgres.py"
+_spec = importlib.util.spec_from_file_location("mcp_postgres", _MCP_PATH)
+mcp_postgres = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(mcp_postgres)
+
+validate_select = mcp_postgres.validate_select
+validate_query_args = mcp_postgres.validate_query_args
+
+
+@pytest.mark.unit
+class TestValidateSelect:
+    """Test which statements validate_select accepts and rejects."""
+
+    @pytest.mark.parametrize("sql", [
+        "SELECT 1",
+        "SELECT id, enunciado FROM preguntas WHERE id = $1;",
+        "WITH t AS (SELECT id FROM preguntas) SELECT count(*) FROM t",
+        "SELECT 1 UNION SELECT 2",
+        "-- comentario\nSELECT 1 -- final",
+    ])
+    def test_accepts_read_only_queries(self, sql):
+        """Test single SELECT/WITH queries are accepted."""
+        assert validate_select(sql) is None
+
+    @pytest.mark.parametrize("sql", [
+        "SELECT 1; DROP TABLE x",
+        "SELECT 1; SELECT 2",
+    ])
+    def test_rejects_stacked_queries(self, sql):
+        """Test more than one statement is rejected."""
+        assert validate_select(sql) == "Only a single statement is allowed"
+
+    @pytest.mark.parametrize("sql", [
+        "WITH d AS (DELETE FROM preguntas RETURNING *) SELECT * FROM d",
+        "WITH u AS (UPDATE preguntas SET tema = 'x' RETURNING id) SELECT * FROM u",
+        "WITH i AS (INSERT INTO preguntas (id) VALUES (1) RETURNING id) SELECT * FROM i",
+        "SELECT * INTO t FROM preguntas",
+    ])
+    def test_rejects_writes_inside_select(self, sql):
+        """Test data-modifying CTEs and SELECT ... INTO are rejected."""
+        assert validate_select(sql) == "Only SELECT queries are allowed"
+
+    @pytest.mark.parametrize("sql", [
+        "DROP TABLE x",
+        "DELETE FROM preguntas",
+        "UPDATE preguntas SET tema = 'x'",
+    ])
+    def test_rejects_other_statements(self, sql):
+        """Test statements that are not queries are rejected."""
+        assert validate_select(sql) == "Only SELECT queries are allowed"
+
+    def test_rejects_invalid_sql(self):
+        """Test unparseable SQL is reported as invalid."""
+        assert validate_select("SELECT FROM WHERE (").startswith("Invalid SQL")
+
+    def test_query_args_types(self):
+        """Test non-string SQL and non-array params are rejected before parsing."""
+        assert validate_query_args(None, None) == "sql must be a string"
+        assert validate_query_args("SELECT 1", {"a": 1}) == "params must be an array"
+        assert validate_query_args("SELECT $1", [1]) is None